@@ -1,156 +1,290 @@
 import pandas as pd
-import requests
-import time
 import json
+from Response_Cache import cached_get
+from Negative_Cache import get_negative_cache
+from Sheet_Loader import load_sheet, column_or_missing, excel_row_numbers
+from Name_Matcher import build_name_index, match_name, DEFAULT_MIN_SCORE
 
+COINGECKO_API_URL = "https://api.coingecko.com/api/v3"
+MARKETS_PAGE_SIZE = 250  # ids per /coins/markets request (the API maximum)
+BULK_MODE = True  # resolve names against /coins/list instead of /search + /coins/{id} per row
 
-def find_missing_symbols(excel_file):
+
+def not_found_record(row_num, name, reason):
+    """Result record for a name CoinGecko has no match for."""
+    return {
+        "Row": row_num,
+        "Name": name,
+        "Symbol": "Not found",
+        "Blockchain": "Not available",
+        "Address": "Not available",
+        "Price": "Not available",
+        "Reason": reason
+    }
+
+
+def lookup_coin_by_name(row_num, name, symbol=None):
     """
-    reads an Excel file, extracts cryptocurrency information for rows with names but missing symbols
-    returns a list of dictionaries with the results.
+    Looks up one asset on CoinGecko by name and builds its result record.
+    An existing symbol is kept; otherwise the symbol of the best search match is used.
     """
-    # Read the Excel file
-    df = pd.read_excel(excel_file, sheet_name="Assets missing info")
+    negative_cache = get_negative_cache()
 
-    # Create a list to store the results
-    results = []
+    # Skip names that were not found recently - they are re-checked once the entry expires
+    miss_key = f"name:{str(name).strip().lower()}"
+    known_miss = negative_cache.get('coingecko', miss_key)
+    if known_miss:
+        return not_found_record(row_num, name, known_miss['reason'])
 
-    # Iterate through the rows
-    for index, row in df.iterrows():
-        # Check if there's a name but no symbol OR if there's a symbol but no address/blockchain
-        if (pd.notna(row.get('Name')) and pd.isna(row.get('Symbol'))) or \
-                (pd.notna(row.get('Name')) and pd.notna(row.get('Symbol')) and (
-                        pd.isna(row.get('Blockchain')) or pd.isna(row.get('Address')))):
-            name = row['Name']
-            symbol = row.get('Symbol') if pd.notna(row.get('Symbol')) else None
-            row_num = index + 2  # Add 2 for Excel row number (1-based + header)
-
-            # Single print statement showing which row and what we're searching for
-            if symbol:
-                print(f"Processing row {row_num}: Searching for address/blockchain for '{name}' ({symbol})")
-            else:
-                print(f"Processing row {row_num}: Searching for information for '{name}'")
-
-            try:
-                # Search for the currency by name using CoinGecko API
-                search_response = requests.get(
-                    "https://api.coingecko.com/api/v3/search",
-                    params={"query": name}
-                )
-
-                # Handle rate limiting
-                if search_response.status_code == 429:
-                    time.sleep(60)
-                    search_response = requests.get(
-                        "https://api.coingecko.com/api/v3/search",
-                        params={"query": name}
-                    )
-
-                # Process search results
-                if search_response.status_code == 200:
-                    search_data = search_response.json()
-
-                    if search_data.get('coins') and len(search_data['coins']) > 0:
-                        # Get information about the currency
-                        coin = search_data['coins'][0]
-                        coin_id = coin['id']
-                        symbol = symbol or coin['symbol'].upper()  # Use existing symbol if available
-
-                        # Get detailed information about the currency
-                        coin_response = requests.get(f"https://api.coingecko.com/api/v3/coins/{coin_id}")
-
-                        # Handle rate limiting
-                        if coin_response.status_code == 429:
-                            time.sleep(60)
-                            coin_response = requests.get(f"https://api.coingecko.com/api/v3/coins/{coin_id}")
-
-                        if coin_response.status_code == 200:
-                            coin_data = coin_response.json()
-
-                            # Get price
-                            price = coin_data.get('market_data', {}).get('current_price', {}).get('usd',
-                                                                                                  'Not available')
-                            
-                            # Add dollar sign to price if it's a number
-                            if price != 'Not available':
-                                price = f"${price}"
-
-                            # Get blockchain and address
-                            platforms = coin_data.get('platforms', {})
-                            blockchain = "Not available"
-                            address = "Not available"
-
-                            # Find the first valid blockchain and address
-                            for bc, addr in platforms.items():
-                                if addr:
-                                    blockchain = bc
-                                    address = addr
-                                    break
-
-                            # Add to results
-                            results.append({
-                                "Row": row_num,
-                                "Name": name,
-                                "Symbol": symbol,
-                                "Blockchain": blockchain,
-                                "Address": address,
-                                "Price": price
-                            })
-                        else:
-                            # API error for detailed information
-                            results.append({
-                                "Row": row_num,
-                                "Name": name,
-                                "Symbol": symbol,
-                                "Blockchain": "Not available",
-                                "Address": "Not available",
-                                "Price": "Not available",
-                                "Reason": f"API error: {coin_response.status_code}"
-                            })
-                    else:
-                        # No currency found
-                        results.append({
-                            "Row": row_num,
-                            "Name": name,
-                            "Symbol": "Not found",
-                            "Blockchain": "Not available",
-                            "Address": "Not available",
-                            "Price": "Not available",
-                            "Reason": "Symbol not found"
-                        })
+    try:
+        # Search for the currency by name using CoinGecko API
+        # (cached on disk; misses are paced by the shared rate limiter)
+        search_response = cached_get(
+            f"{COINGECKO_API_URL}/search",
+            params={"query": name}
+        )
+
+        # Process search results
+        if search_response.status_code == 200:
+            search_data = search_response.json()
+
+            if search_data.get('coins') and len(search_data['coins']) > 0:
+                # Get information about the currency
+                coin = search_data['coins'][0]
+                coin_id = coin['id']
+                symbol = symbol or coin['symbol'].upper()  # Use existing symbol if available
+
+                # Get detailed information about the currency
+                coin_response = cached_get(f"{COINGECKO_API_URL}/coins/{coin_id}")
+
+                if coin_response.status_code == 200:
+                    coin_data = coin_response.json()
+
+                    # Get price
+                    price = coin_data.get('market_data', {}).get('current_price', {}).get('usd',
+                                                                                          'Not available')
+                    
+                    # Add dollar sign to price if it's a number
+                    if price != 'Not available':
+                        price = f"${price}"
+
+                    # Get blockchain and address
+                    platforms = coin_data.get('platforms', {})
+                    blockchain = "Not available"
+                    address = "Not available"
+
+                    # Find the first valid blockchain and address
+                    for bc, addr in platforms.items():
+                        if addr:
+                            blockchain = bc
+                            address = addr
+                            break
+
+                    return {
+                        "Row": row_num,
+                        "Name": name,
+                        "Symbol": symbol,
+                        "Blockchain": blockchain,
+                        "Address": address,
+                        "Price": price
+                    }
                 else:
-                    # API error in search
-                    results.append({
+                    # API error for detailed information
+                    return {
                         "Row": row_num,
                         "Name": name,
-                        "Symbol": "Error",
+                        "Symbol": symbol,
                         "Blockchain": "Not available",
                         "Address": "Not available",
                         "Price": "Not available",
-                        "Reason": f"API error: {search_response.status_code}"
-                    })
-
-                # Wait to respect API rate limits
-                time.sleep(1.5)
-
-            except Exception as e:
-                # An error occurred
-                results.append({
-                    "Row": row_num,
-                    "Name": name,
-                    "Symbol": "Error",
-                    "Blockchain": "Not available",
-                    "Address": "Not available",
-                    "Price": "Not available",
-                    "Reason": f"Error: {str(e)}"
-                })
+                        "Reason": f"API error: {coin_response.status_code}"
+                    }
+            else:
+                # No currency found
+                negative_cache.record_miss('coingecko', miss_key, 'not_found', "Symbol not found")
+                return not_found_record(row_num, name, "Symbol not found")
+        else:
+            # API error in search
+            return {
+                "Row": row_num,
+                "Name": name,
+                "Symbol": "Error",
+                "Blockchain": "Not available",
+                "Address": "Not available",
+                "Price": "Not available",
+                "Reason": f"API error: {search_response.status_code}"
+            }
+
+    except Exception as e:
+        # An error occurred
+        return {
+            "Row": row_num,
+            "Name": name,
+            "Symbol": "Error",
+            "Blockchain": "Not available",
+            "Address": "Not available",
+            "Price": "Not available",
+            "Reason": f"Error: {str(e)}"
+        }
+
+
+def load_coin_list():
+    """Downloads (or reads from the cache) every CoinGecko coin with its platforms, None on failure."""
+    response = cached_get(f"{COINGECKO_API_URL}/coins/list", params={"include_platform": "true"})
+    if response is None or response.status_code != 200:
+        print(f"Could not download the CoinGecko coin list: "
+              f"{response.status_code if response is not None else 'no response'}")
+        return None
+    return response.json()
+
+
+def fetch_market_data(coin_ids):
+    """Fetches /coins/markets for many ids, MARKETS_PAGE_SIZE per request, returns {id: market entry}."""
+    markets = {}
+    coin_ids = list(dict.fromkeys(coin_ids))
+    for i in range(0, len(coin_ids), MARKETS_PAGE_SIZE):
+        chunk = coin_ids[i:i + MARKETS_PAGE_SIZE]
+        response = cached_get(f"{COINGECKO_API_URL}/coins/markets", params={
+            "vs_currency": "usd",
+            "ids": ",".join(chunk),
+            "per_page": MARKETS_PAGE_SIZE,
+            "page": 1
+        })
+        if response is not None and response.status_code == 200:
+            for market in response.json():
+                markets[market['id']] = market
+        else:
+            print(f"Could not fetch CoinGecko market data for {len(chunk)} coins")
+    return markets
+
+
+def lookup_coins_bulk(targets):
+    """
+    Resolves (row, name, symbol) targets against the full coin list in one pass.
+
+    Names are matched locally with Name_Matcher; when several coins match equally
+    well (or share the row's symbol), the one with the largest market cap wins.
+    Prices come from /coins/markets in pages of MARKETS_PAGE_SIZE ids, so the
+    whole sheet needs a handful of requests. Names the coin list has no match for
+    go to the per-row /search lookup. Returns None if the coin list is unavailable.
+    """
+    coins = load_coin_list()
+    if coins is None:
+        return None
+    name_index = build_name_index(coins)
+    negative_cache = get_negative_cache()
+
+    # Candidate coins per target
+    candidates = []
+    for row_num, name, symbol in targets:
+        miss_key = f"name:{str(name).strip().lower()}"
+        known_miss = negative_cache.get('coingecko', miss_key)
+        if known_miss:
+            candidates.append(known_miss['reason'])
+            continue
+
+        matches = [(score, coin) for score, coin in match_name(name_index, name, limit=10)
+                   if score >= DEFAULT_MIN_SCORE]
+        if not matches:
+            # Not in the local index; left to /search, which also knows aliases
+            candidates.append(None)
+            continue
+
+        same_symbol = [coin for _, coin in matches
+                       if symbol and str(coin.get('symbol', '')).lower() == str(symbol).lower()]
+        best_score = matches[0][0]
+        candidates.append(same_symbol or [coin for score, coin in matches if score >= best_score])
+
+    markets = fetch_market_data(coin['id'] for options in candidates if isinstance(options, list)
+                                for coin in options)
+
+    unmatched = sum(1 for options in candidates if options is None)
+    if unmatched:
+        print(f"Searching CoinGecko for {unmatched} names not found in the coin list...")
+
+    results = []
+    for (row_num, name, symbol), options in zip(targets, candidates):
+        if options is None:
+            results.append(lookup_coin_by_name(row_num, name, symbol))
+            continue
+        if not isinstance(options, list):
+            results.append(not_found_record(row_num, name, options))
+            continue
+
+        coin = max(options, key=lambda option: (markets.get(option['id']) or {}).get('market_cap') or 0)
+        price = (markets.get(coin['id']) or {}).get('current_price')
+
+        # Find the first valid blockchain and address
+        blockchain = "Not available"
+        address = "Not available"
+        for bc, addr in (coin.get('platforms') or {}).items():
+            if addr:
+                blockchain = bc
+                address = addr
+                break
+
+        results.append({
+            "Row": row_num,
+            "Name": name,
+            "Symbol": symbol or coin['symbol'].upper(),  # Use existing symbol if available
+            "Blockchain": blockchain,
+            "Address": address,
+            "Price": f"${price}" if price is not None else "Not available"
+        })
+
+    return results
+
+
+def find_missing_symbols(excel_file, bulk=BULK_MODE):
+    """
+    reads an Excel file, extracts cryptocurrency information for rows with names but missing symbols
+    returns a list of dictionaries with the results.
+    With bulk=True all rows are resolved together against the coin list (see lookup_coins_bulk),
+    otherwise each row is searched separately.
+    """
+    # Read the Excel file (shared with the other scanners)
+    df = load_sheet(excel_file)
+    names = column_or_missing(df, 'Name')
+    symbols = column_or_missing(df, 'Symbol')
+
+    # Rows with a name but no symbol OR with a symbol but no address/blockchain
+    mask = names.notna() & (symbols.isna() | column_or_missing(df, 'Blockchain').isna() |
+                            column_or_missing(df, 'Address').isna())
+
+    targets = [(int(row_num), name, symbol if pd.notna(symbol) else None)
+               for row_num, name, symbol in zip(excel_row_numbers(df)[mask], names[mask], symbols[mask])]
+
+    # Names CoinGecko had no match for in earlier runs
+    negative_cache = get_negative_cache()
+
+    if bulk:
+        print(f"Resolving {len(targets)} names against the CoinGecko coin list...")
+        results = lookup_coins_bulk(targets)
+        if results is not None:
+            negative_cache.save()
+            return results
+        print("Falling back to per-row CoinGecko search")
+
+    # Create a list to store the results
+    results = []
+
+    for row_num, name, symbol in targets:
+        # Single print statement showing which row and what we're searching for
+        if symbol:
+            print(f"Processing row {row_num}: Searching for address/blockchain for '{name}' ({symbol})")
+        else:
+            print(f"Processing row {row_num}: Searching for information for '{name}'")
+
+        results.append(lookup_coin_by_name(row_num, name, symbol))
 
+    negative_cache.save()
     return results
 
 
 def coingecko():
     """
     Main function to process missing symbols using CoinGecko API
+    Returns the list of results that is also saved to missing_symbols_results.json
     """
     file_path = "Fireblocks_Task__-_assets_with_missing_info.xlsx"
     missing_info = find_missing_symbols(file_path)
@@ -169,6 +303,7 @@ def coingecko():
         json.dump(missing_info, f, indent=2, ensure_ascii=False)
 
     print(f"\nResults saved to file: missing_symbols_results.json")
+    return missing_info
 
 
 # Usage example
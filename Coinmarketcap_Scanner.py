@@ -1,16 +1,53 @@
+import asyncio
 import json
 import os
-import pandas as pd
 import requests
 import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Tuple
+from Name_Matcher import build_name_index, best_match
+from Negative_Cache import get_negative_cache
+from Rate_Limiter import rate_limited_get
+from Response_Cache import cached_get
+from Response_Archive import is_replay
+from Sheet_Loader import load_sheet, excel_row_numbers
+from Typed_Store import is_missing, read_records, write_records, store_path
+
+# Number of ids sent in one /quotes/latest request
+QUOTES_BATCH_SIZE = 100
+# Number of symbols sent in one /info request
+SYMBOL_BATCH_SIZE = 100
+# Local copy of the full /map listing, refreshed once it is older than MAP_SNAPSHOT_MAX_AGE seconds
+MAP_SNAPSHOT_FILE = 'cmc_map_snapshot.json'
+MAP_SNAPSHOT_MAX_AGE = 24 * 60 * 60
+MAP_PAGE_SIZE = 5000
+# Requests kept in flight by the async engine (the shared rate limiter still caps the rate)
+MAX_CONCURRENCY = 8
+
+# A row carrying all of these from earlier data was already enriched and is skipped
+COMPLETE_FIELDS = ['Name', 'Symbol', 'Blockchain', 'Price', 'MarketCap', 'Slug']
+
+# CoinMarketCap platform names (lowercase) for chains the sheet names differently
+CHAIN_ALIASES = {
+    'bnb': 'bnb smart chain',
+    'bnb smart chain (bep20)': 'bnb smart chain',
+    'binance smart chain': 'bnb smart chain',
+    'bsc': 'bnb smart chain',
+    'eth': 'ethereum',
+    'pol (prev. matic)': 'polygon',
+    'matic': 'polygon'
+}
+
+API_URLS = {
+    'metadata': 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/info',
+    'quotes': 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest'
+}
 
 
 def extract_data_from_excel(excel_file: str, sheet_name: str = "Assets missing info") -> List[Dict[str, Any]]:
     """Extract data from Excel file and create structured data"""
     try:
-        df = pd.read_excel(excel_file, sheet_name=sheet_name)
+        df = load_sheet(excel_file, sheet_name)
 
         # Map columns based on keywords
         column_mapping = {}
@@ -38,16 +75,15 @@ def extract_data_from_excel(excel_file: str, sheet_name: str = "Assets missing i
             if field not in column_mapping and i < len(excel_columns):
                 column_mapping[field] = excel_columns[i]
 
-        # Create structured data
-        result = []
-        for index, row in df.iterrows():
-            entry = {"Row": index + 2}  # Excel rows start from 1, and we have a header
+        # Create structured data, converting whole columns to strings with NaN as "Not found"
+        columns = {"Row": excel_row_numbers(df).tolist()}  # Excel rows start from 1, and we have a header
+        for json_field, excel_col in column_mapping.items():
+            values = df[excel_col]
+            columns[json_field] = values.map(str).where(values.notna(), "Not found").tolist()
 
-            for json_field, excel_col in column_mapping.items():
-                if excel_col in row:
-                    value = row[excel_col]
-                    # Convert values to strings properly, handling NaN values
-                    entry[json_field] = str(value) if pd.notna(value) else "Not found"
+        result = []
+        for values in zip(*columns.values()):
+            entry = dict(zip(columns.keys(), values))
 
             # Initialize additional fields
             entry["MarketCap"] = "Not found"
@@ -67,294 +103,650 @@ def extract_data_from_excel(excel_file: str, sheet_name: str = "Assets missing i
         return []
 
 
-def enhance_with_coinmarketcap(data: List[Dict[str, Any]], api_key: str, batch_size: int = 10) -> List[Dict[str, Any]]:
-    """Enhance crypto data using CoinMarketCap API - optimized version with address-first approach"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+def new_metadata_cache() -> Dict[str, Dict[str, Any]]:
+    """Cache for metadata to reduce API calls - store by address, symbol, and name"""
+    return {
+        'by_address': {},
+        'by_symbol': {},
+        'by_name': {},
+        'quotes': {}
+    }
 
-    if not api_key:
-        return data
 
-    # Test API key
+def check_api_key(headers: Dict[str, str]) -> None:
+    """Make one cheap request so an invalid key shows up before the scan starts"""
     url = 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/map'
-    headers = {'Accepts': 'application/json', 'X-CMC_PRO_API_KEY': api_key}
+    if is_replay():
+        return
     try:
-        response = requests.get(url, headers=headers, params={'limit': 1})
+        rate_limited_get(url, params={'limit': 1}, headers=headers)
     except Exception:
         pass
 
-    # Setup API endpoints
-    api_urls = {
-        'metadata': 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/info',
-        'quotes': 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest'
-    }
-    headers = {'Accepts': 'application/json', 'X-CMC_PRO_API_KEY': api_key}
 
-    # Rate limiting
-    rate_limit = {'per_minute': 30, 'count': 0, 'start_time': time.time()}
+def prepare_metadata_cache(data: List[Dict[str, Any]], api_urls: Dict[str, str], headers: Dict[str, str],
+                           metadata_cache: Dict[str, Dict[str, Any]], fetch: Callable = None) -> None:
+    """Resolve symbols, addresses and names for all rows with bulk requests before the row loop"""
+    # Resolve all distinct symbols up front with a few bulk /info requests
+    prefetch_symbol_metadata(data, api_urls['metadata'], headers, metadata_cache, fetch=fetch)
+
+    # Resolve addresses and names against the local map snapshot
+    map_entries = load_map_snapshot(headers)
+    map_index = build_map_index(map_entries)
+    name_index = build_name_index(sorted(map_entries, key=lambda coin: coin.get('rank') or float('inf')))
+    prefetch_map_metadata(data, map_index, name_index, api_urls['metadata'], headers, metadata_cache, fetch=fetch)
+
+
+def apply_quotes(pending_quotes: List[Tuple[Dict[str, Any], str]], metadata_cache: Dict[str, Dict[str, Any]],
+                 url: str, headers: Dict[str, str], fetch: Callable = None) -> None:
+    """Fetch quotes for all unique ids in a few batched requests and copy them into their rows"""
+    fetch = fetch or fetch_in_chunks
+    missing_ids = [coin_id for _, coin_id in pending_quotes if coin_id not in metadata_cache['quotes']]
+    if missing_ids:
+        print(f"Fetching quotes for {len(set(missing_ids))} assets in batches of {QUOTES_BATCH_SIZE}...")
+        metadata_cache['quotes'].update(fetch(url, headers, 'id', missing_ids, QUOTES_BATCH_SIZE))
+
+    for entry, coin_id in pending_quotes:
+        if coin_id in metadata_cache['quotes']:
+            process_quotes_data(entry, metadata_cache['quotes'][coin_id])
+
+
+def write_run_outputs(enhanced_data: List[Dict[str, Any]], not_found: List[Dict[str, Any]],
+                      corrections: List[Dict[str, Any]], timestamp: str) -> None:
+    """Save the enhanced rows plus the not-found and corrections debug files"""
+    # Final check for empty fields
+    for entry in enhanced_data:
+        for field in entry:
+            if not entry[field] and field != "Row":
+                entry[field] = "Not found"
+
+    # Save all results to a single typed record file
+    write_records(store_path('enhanced_crypto_data', timestamp), enhanced_data)
+
+    # Also save additional debug files if needed
+    if not_found:
+        not_found_file = f'not_found_entries_{timestamp}.json'
+        with open(not_found_file, 'w', encoding='utf-8') as f:
+            json.dump(not_found, f, indent=2, ensure_ascii=False)
+
+    if corrections:
+        corrections_file = f'data_corrections_{timestamp}.json'
+        with open(corrections_file, 'w', encoding='utf-8') as f:
+            json.dump(corrections, f, indent=2, ensure_ascii=False)
+
+
+def enhance_with_coinmarketcap(data: List[Dict[str, Any]], api_key: str, batch_size: int = 10,
+                               checkpoint_file: str = None, resume: bool = False,
+                               status: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """
+    Enhance crypto data using CoinMarketCap API - optimized version with address-first approach
+
+    Every completed row is appended to checkpoint_file (fsync every batch_size rows).
+    With resume=True, rows already in the checkpoint are restored instead of looked up again.
+    status['completed'] is set to True only when every row and the quotes were processed.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    checkpoint_file = checkpoint_file or f'enhanced_crypto_data_checkpoint_{timestamp}.jsonl'
+    status = {} if status is None else status
+    status['completed'] = False
+
+    if not api_key:
+        return data
+
+    headers = {'Accepts': 'application/json', 'X-CMC_PRO_API_KEY': api_key}
+    check_api_key(headers)
 
     # Output collections
     enhanced_data = []
     not_found = []
     corrections = []
 
-    # Cache for metadata to reduce API calls - store by address, symbol, and name
-    metadata_cache = {
-        'by_address': {},
-        'by_symbol': {},
-        'by_name': {}
-    }
+    metadata_cache = new_metadata_cache()
+
+    # Rows waiting for quotes, filled during the metadata pass
+    pending_quotes = []
+
+    completed_rows = load_checkpoint(checkpoint_file) if resume else {}
+    checkpoint = open_checkpoint(checkpoint_file)
 
     try:
         # Sort by row number
         sorted_data = sorted(data, key=lambda x: x["Row"])
         total = len(sorted_data)
-        processed = 0
+
+        remaining = [entry for entry in sorted_data
+                     if entry['Row'] not in completed_rows and not entry.get('_complete')]
+        prepare_metadata_cache(remaining, API_URLS, headers, metadata_cache)
 
         for i, entry in enumerate(sorted_data):
-            address = entry.get('Address', '').strip()
-            symbol = entry.get('Symbol', '').strip()
-            name = entry.get('Name', '').strip()
+            record = completed_rows.get(entry['Row'])
+            if record:
+                # Completed before the interruption - restore instead of looking it up again
+                entry, coin_id, row_not_found, row_corrections = restore_checkpoint_record(record)
+            elif entry.pop('_complete', False):
+                # Already enriched in the existing data
+                coin_id, row_not_found, row_corrections = None, [], []
+            else:
+                print(f"Row {entry['Row']} ({i + 1}/{total}): Processing asset...")
+                row_not_found = []
+                row_corrections = []
+                coin_id = enhance_entry(entry, metadata_cache, API_URLS, headers, row_not_found, row_corrections)
+                append_checkpoint(checkpoint, entry, coin_id, row_not_found, row_corrections,
+                                  sync=(i + 1) % batch_size == 0)
+
+            not_found.extend(row_not_found)
+            corrections.extend(row_corrections)
+            if coin_id:
+                pending_quotes.append((entry, coin_id))
 
-            # Add lookup method field to track how we found this data
-            entry['LookupMethod'] = 'Not found'
+            # Add to enhanced data
+            enhanced_data.append(entry)
 
-            print(f"Row {entry['Row']} ({i + 1}/{total}): Processing asset...")
+        # Second pass: fetch quotes for all unique ids in a few batched requests
+        apply_quotes(pending_quotes, metadata_cache, API_URLS['quotes'], headers)
+        status['completed'] = True
 
-            try:
-                coin_data = None
-                search_method = None
-
-                # First try by address (most reliable)
-                if address and address != "Not found":
-                    if address in metadata_cache['by_address']:
-                        coin_data = metadata_cache['by_address'][address]
-                        search_method = 'address_cache'
-                    else:
-                        # In real implementation, would need to call an API that allows search by address
-                        # CoinMarketCap doesn't directly support this, so we might need another API
-                        # This is just a placeholder for the logic
-                        pass
-
-                # Next try by symbol
-                if not coin_data and symbol and symbol != "Not found":
-                    if symbol in metadata_cache['by_symbol']:
-                        coin_data = metadata_cache['by_symbol'][symbol]
-                        search_method = 'symbol_cache'
-                    else:
-                        handle_rate_limiting(rate_limit)
-                        parameters = {'symbol': symbol}
-                        response = make_api_request(api_urls['metadata'], headers, parameters, rate_limit)
-
-                        if response and response.status_code == 200:
-                            metadata = response.json()
-                            if 'data' in metadata and symbol in metadata['data']:
-                                coin_data = metadata['data'][symbol]
-                                metadata_cache['by_symbol'][symbol] = coin_data
-                                search_method = 'symbol_api'
-
-                # Finally try by name
-                if not coin_data and name and name != "Not found":
-                    if name in metadata_cache['by_name']:
-                        coin_data = metadata_cache['by_name'][name]
-                        search_method = 'name_cache'
-                    else:
-                        # CoinMarketCap doesn't have a direct name search, but we can try a map lookup
-                        # and filter results
-                        handle_rate_limiting(rate_limit)
-                        # This would ideally use a search endpoint, but we're approximating
-                        map_params = {'limit': 5000}  # Get a large list to search
-                        response = make_api_request('https://pro-api.coinmarketcap.com/v1/cryptocurrency/map',
-                                                    headers, map_params, rate_limit)
-
-                        if response and response.status_code == 200:
-                            map_data = response.json()
-                            if 'data' in map_data:
-                                # Try to find a coin with a name that closely matches
-                                found = False
-                                for coin in map_data['data']:
-                                    # Check for exact match or close match
-                                    if coin['name'].lower() == name.lower() or name.lower() in coin['name'].lower():
-                                        # Get the full metadata for this coin
-                                        handle_rate_limiting(rate_limit)
-                                        detail_params = {'id': coin['id']}
-                                        detail_response = make_api_request(api_urls['metadata'],
-                                                                           headers, detail_params, rate_limit)
-
-                                        if detail_response and detail_response.status_code == 200:
-                                            detail_data = detail_response.json()
-                                            if 'data' in detail_data and str(coin['id']) in detail_data['data']:
-                                                coin_data = detail_data['data'][str(coin['id'])]
-                                                metadata_cache['by_name'][name] = coin_data
-                                                search_method = 'name_api'
-                                                found = True
-                                                break
-
-                # Process the coin data if found
-                if coin_data:
-                    entry['LookupMethod'] = search_method
-
-                    # Check and correct name if needed
-                    if 'name' in coin_data:
-                        if entry['Name'] != "Not found" and entry['Name'] != coin_data['name']:
-                            corrections.append({
-                                "Row": entry['Row'],
-                                "Field": "Name",
-                                "Original": entry['Name'],
-                                "Corrected": coin_data['name']
-                            })
-                        entry['Name'] = coin_data['name']
-
-                    # Get blockchain and network details
-                    if 'platform' in coin_data and coin_data['platform']:
-                        entry['Blockchain'] = coin_data['platform']['name']
-                        if 'symbol' in coin_data['platform']:
-                            entry['Network'] = coin_data['platform']['symbol']
-
-                    # Add metadata
-                    for field, source in [('Slug', 'slug'), ('DateAdded', 'date_added')]:
-                        if source in coin_data:
-                            entry[field] = coin_data[source]
-
-                    if 'tags' in coin_data and coin_data['tags']:
-                        try:
-                            entry['Tags'] = ','.join(coin_data['tags'])
-                        except TypeError:
-                            # Handle case when tags is not iterable
-                            entry['Tags'] = str(coin_data['tags'])
-
-                    # Get quotes data
-                    coin_id = coin_data.get('id')
-                    if coin_id:
-                        quote_key = str(coin_id)
-                        # Check if we already have quotes data cached
-                        if 'quotes' in metadata_cache and quote_key in metadata_cache['quotes']:
-                            process_quotes_data(entry, metadata_cache['quotes'][quote_key])
-                        else:
-                            # Make a new request for quotes
-                            handle_rate_limiting(rate_limit)
-                            quote_params = {'id': coin_id}
-                            quote_response = make_api_request(api_urls['quotes'], headers, quote_params, rate_limit)
-
-                            if quote_response and quote_response.status_code == 200:
-                                quote_data = quote_response.json()
-
-                                if 'data' in quote_data and quote_key in quote_data['data']:
-                                    # Cache the quotes data
-                                    if 'quotes' not in metadata_cache:
-                                        metadata_cache['quotes'] = {}
-
-                                    metadata_cache['quotes'][quote_key] = quote_data['data'][quote_key]
-                                    process_quotes_data(entry, quote_data['data'][quote_key])
-                else:
-                    # Record why we couldn't find it
-                    reason = "No valid identifiers found"
-                    if not symbol and not name and not address:
-                        reason = "No symbol, name, or address available"
-                    elif not symbol and not name:
-                        reason = f"Address '{address}' not found, no symbol or name available"
-                    elif not symbol:
-                        reason = f"Address '{address}' not found, name '{name}' not found"
-                    else:
-                        reason = f"Symbol '{symbol}' not found"
-
-                    not_found.append({
-                        "Row": entry['Row'],
-                        "Reason": reason
-                    })
+    except KeyboardInterrupt:
+        print(f"Interrupted - resume later from checkpoint {checkpoint_file}")
+
+    finally:
+        close_checkpoint(checkpoint)
+        write_run_outputs(enhanced_data, not_found, corrections, timestamp)
 
-                    # If we have a symbol, remember that it wasn't found to avoid future lookups
-                    if symbol:
-                        metadata_cache['by_symbol'][symbol] = None
+    return enhanced_data
 
-            except Exception as e:
-                not_found.append({
-                    "Row": entry['Row'],
-                    "Reason": f"Error: {str(e)}"
-                })
 
-            # Ensure no empty fields
-            for field in entry:
-                if not entry[field] and field != "Row":
-                    entry[field] = "Not found"
+async def fetch_in_chunks_async(url: str, headers: Dict[str, str], param_name: str, values: List[str],
+                                chunk_size: int, semaphore: asyncio.Semaphore,
+                                failed: List[str] = None) -> Dict[str, Any]:
+    """Async version of fetch_in_chunks that keeps up to `semaphore` chunk requests in flight"""
+    async def fetch_one(chunk):
+        async with semaphore:
+            return await asyncio.to_thread(fetch_chunk, url, headers, param_name, chunk, failed)
 
-            # Add to enhanced data
+    results = {}
+    for data in await asyncio.gather(*(fetch_one(chunk) for chunk in split_chunks(values, chunk_size))):
+        results.update(data)
+    return results
+
+
+async def enhance_with_coinmarketcap_async(data: List[Dict[str, Any]], api_key: str, batch_size: int = 10,
+                                           max_concurrency: int = MAX_CONCURRENCY, checkpoint_file: str = None,
+                                           resume: bool = False, status: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """
+    Concurrent version of enhance_with_coinmarketcap
+
+    Keeps up to max_concurrency requests in flight; the shared rate limiter still
+    caps the request rate. Produces the same enhanced rows, not-found entries and
+    corrections, ordered by Row, and uses the same checkpoint format and status.
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    checkpoint_file = checkpoint_file or f'enhanced_crypto_data_checkpoint_{timestamp}.jsonl'
+    status = {} if status is None else status
+    status['completed'] = False
+
+    if not api_key:
+        return data
+
+    headers = {'Accepts': 'application/json', 'X-CMC_PRO_API_KEY': api_key}
+    await asyncio.to_thread(check_api_key, headers)
+
+    enhanced_data = []
+    not_found = []
+    corrections = []
+    metadata_cache = new_metadata_cache()
+    pending_quotes = []
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    def fetch(url, request_headers, param_name, values, chunk_size, failed=None):
+        # Called from worker threads: run the chunks concurrently on the event loop
+        future = asyncio.run_coroutine_threadsafe(
+            fetch_in_chunks_async(url, request_headers, param_name, values, chunk_size, semaphore, failed), loop)
+        return future.result()
+
+    # Per-row outputs by position in Row order, stored as each row finishes
+    finished_rows = {}
+
+    def collect_finished_rows():
+        # Move finished rows into the outputs in Row order, as the sequential loop would
+        for position in sorted(finished_rows):
+            entry, coin_id, row_not_found, row_corrections = finished_rows.pop(position)
             enhanced_data.append(entry)
-            processed += 1
+            not_found.extend(row_not_found)
+            corrections.extend(row_corrections)
+            if coin_id:
+                pending_quotes.append((entry, coin_id))
+
+    completed_rows = load_checkpoint(checkpoint_file) if resume else {}
+    checkpoint = open_checkpoint(checkpoint_file)
+
+    try:
+        sorted_data = sorted(data, key=lambda x: x["Row"])
+        total = len(sorted_data)
+
+        remaining = [entry for entry in sorted_data
+                     if entry['Row'] not in completed_rows and not entry.get('_complete')]
+        await asyncio.to_thread(prepare_metadata_cache, remaining, API_URLS, headers, metadata_cache, fetch)
+
+        completed = []
+
+        async def process_row(position, entry):
+            record = completed_rows.get(entry['Row'])
+            if record:
+                finished_rows[position] = restore_checkpoint_record(record)
+                return
+            if entry.pop('_complete', False):
+                finished_rows[position] = (entry, None, [], [])
+                return
 
-            # Small delay between requests to avoid overloading the API
-            time.sleep(0.25)
+            row_not_found = []
+            row_corrections = []
+            async with semaphore:
+                coin_id = await asyncio.to_thread(enhance_entry, entry, metadata_cache, API_URLS, headers,
+                                                  row_not_found, row_corrections)
+            completed.append(entry)
+            print(f"Row {entry['Row']} ({len(completed)}/{len(remaining)}): Processing asset...")
 
-            # Save intermediate results (but don't prompt)
-            if i > 0 and i % batch_size == 0:
-                save_results_to_file(enhanced_data, timestamp, i, total, batch_size)
+            # Checkpoint writes happen on the event loop thread, one line per row
+            append_checkpoint(checkpoint, entry, coin_id, row_not_found, row_corrections,
+                              sync=len(completed) % batch_size == 0)
+            finished_rows[position] = (entry, coin_id, row_not_found, row_corrections)
+
+        await asyncio.gather(*(process_row(position, entry) for position, entry in enumerate(sorted_data)))
+        collect_finished_rows()
+
+        await asyncio.to_thread(apply_quotes, pending_quotes, metadata_cache, API_URLS['quotes'], headers, fetch)
+        status['completed'] = True
 
     except KeyboardInterrupt:
-        pass
+        print(f"Interrupted - resume later from checkpoint {checkpoint_file}")
+
+    except asyncio.CancelledError:
+        print(f"Cancelled - resume later from checkpoint {checkpoint_file}")
+        raise
 
     finally:
-        # Final check for empty fields
-        for entry in enhanced_data:
-            for field in entry:
-                if not entry[field] and field != "Row":
-                    entry[field] = "Not found"
+        # Rows finished before an interruption are written too, as the sequential loop does
+        collect_finished_rows()
+        close_checkpoint(checkpoint)
+        write_run_outputs(enhanced_data, not_found, corrections, timestamp)
 
-        # Save all results to a single JSON file
-        output_file = f'enhanced_crypto_data_{timestamp}.json'
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(enhanced_data, f, indent=2, ensure_ascii=False)
+    return enhanced_data
 
-        # Also save additional debug files if needed
-        if not_found:
-            not_found_file = f'not_found_entries_{timestamp}.json'
-            with open(not_found_file, 'w', encoding='utf-8') as f:
-                json.dump(not_found, f, indent=2, ensure_ascii=False)
 
-        if corrections:
-            corrections_file = f'data_corrections_{timestamp}.json'
-            with open(corrections_file, 'w', encoding='utf-8') as f:
-                json.dump(corrections, f, indent=2, ensure_ascii=False)
+def enhance_entry(entry: Dict[str, Any], metadata_cache: Dict[str, Dict[str, Any]], api_urls: Dict[str, str],
+                  headers: Dict[str, str], not_found: List[Dict[str, Any]],
+                  corrections: List[Dict[str, Any]]) -> Optional[str]:
+    """Fill one row from the metadata cache and return its CMC id for the quotes pass"""
+    address = entry.get('Address', '').strip()
+    symbol = entry.get('Symbol', '').strip()
+    name = entry.get('Name', '').strip()
 
-    return enhanced_data
+    # Add lookup method field to track how we found this data
+    entry['LookupMethod'] = 'Not found'
+
+    coin_id = None
+    try:
+        coin_data = None
+        search_method = None
+
+        # First try by address (most reliable) - resolved through the map snapshot
+        if address and address != "Not found":
+            if address in metadata_cache['by_address']:
+                coin_data = metadata_cache['by_address'][address]
+                search_method = 'address_cache'
+
+        # Next try by symbol
+        if not coin_data and symbol and symbol != "Not found":
+            if symbol in metadata_cache['by_symbol']:
+                coin_data = metadata_cache['by_symbol'][symbol]
+                search_method = 'symbol_cache'
+            else:
+                parameters = {'symbol': symbol}
+                response = make_api_request(api_urls['metadata'], headers, parameters)
+
+                if response and response.status_code == 200:
+                    metadata = response.json()
+                    if 'data' in metadata and symbol in metadata['data']:
+                        coin_data = metadata['data'][symbol]
+                        metadata_cache['by_symbol'][symbol] = coin_data
+                        search_method = 'symbol_api'
+
+        # Finally try by name - exact and fuzzy matches were resolved up front
+        if not coin_data and name and name != "Not found":
+            if name in metadata_cache['by_name']:
+                coin_data = metadata_cache['by_name'][name]
+                search_method = 'name_cache'
+
+        # Process the coin data if found
+        if coin_data:
+            entry['LookupMethod'] = search_method
+
+            # Check and correct name if needed
+            if 'name' in coin_data:
+                if entry['Name'] != "Not found" and entry['Name'] != coin_data['name']:
+                    corrections.append({
+                        "Row": entry['Row'],
+                        "Field": "Name",
+                        "Original": entry['Name'],
+                        "Corrected": coin_data['name']
+                    })
+                entry['Name'] = coin_data['name']
+
+            # Get blockchain and network details
+            if 'platform' in coin_data and coin_data['platform']:
+                entry['Blockchain'] = coin_data['platform']['name']
+                if 'symbol' in coin_data['platform']:
+                    entry['Network'] = coin_data['platform']['symbol']
+
+            # Add metadata
+            for field, source in [('Slug', 'slug'), ('DateAdded', 'date_added')]:
+                if source in coin_data:
+                    entry[field] = coin_data[source]
+
+            if 'tags' in coin_data and coin_data['tags']:
+                try:
+                    entry['Tags'] = ','.join(coin_data['tags'])
+                except TypeError:
+                    # Handle case when tags is not iterable
+                    entry['Tags'] = str(coin_data['tags'])
+
+            # Quotes are fetched for all rows at once after the metadata pass
+            if coin_data.get('id'):
+                coin_id = str(coin_data['id'])
+        else:
+            # Record why we couldn't find it
+            reason = "No valid identifiers found"
+            if not symbol and not name and not address:
+                reason = "No symbol, name, or address available"
+            elif not symbol and not name:
+                reason = f"Address '{address}' not found, no symbol or name available"
+            elif not symbol:
+                reason = f"Address '{address}' not found, name '{name}' not found"
+            else:
+                reason = f"Symbol '{symbol}' not found"
+
+            not_found.append({
+                "Row": entry['Row'],
+                "Reason": reason
+            })
+
+            # If we have a symbol, remember that it wasn't found to avoid future lookups
+            if symbol:
+                metadata_cache['by_symbol'][symbol] = None
 
+    except Exception as e:
+        not_found.append({
+            "Row": entry['Row'],
+            "Reason": f"Error: {str(e)}"
+        })
+
+    # Ensure no empty fields
+    for field in entry:
+        if not entry[field] and field != "Row":
+            entry[field] = "Not found"
+
+    return coin_id
+
+
+def prefetch_symbol_metadata(data: List[Dict[str, Any]], url: str, headers: Dict[str, str],
+                             metadata_cache: Dict[str, Dict[str, Any]],
+                             chunk_size: int = SYMBOL_BATCH_SIZE, fetch: Callable = None) -> None:
+    """
+    Fill metadata_cache['by_symbol'] for every distinct symbol using bulk /info requests
+
+    Symbols remembered as misses in the persistent negative cache are not requested again
+    until their entry expires.
+    """
+    negative_cache = get_negative_cache()
+    symbols = []
+    for entry in data:
+        symbol = entry.get('Symbol', '').strip()
+        # Commas would split the symbol inside the comma-separated request
+        if symbol and symbol != "Not found" and ',' not in symbol and symbol not in metadata_cache['by_symbol']:
+            if negative_cache.is_known_miss('coinmarketcap', f'symbol:{symbol}'):
+                metadata_cache['by_symbol'][symbol] = None
+            else:
+                symbols.append(symbol)
+
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return
+
+    print(f"Resolving {len(symbols)} symbols in batches of {chunk_size}...")
+    failed = []
+    results = (fetch or fetch_in_chunks)(url, headers, 'symbol', symbols, chunk_size, failed=failed)
+
+    # Symbols missing from the response are cached as None so the row loop skips them
+    for symbol in symbols:
+        coin_data = results.get(symbol) or results.get(symbol.upper())
+        metadata_cache['by_symbol'][symbol] = coin_data
+        if coin_data:
+            negative_cache.clear('coinmarketcap', f'symbol:{symbol}')
+        elif symbol not in failed:
+            negative_cache.record_miss('coinmarketcap', f'symbol:{symbol}', 'not_found',
+                                       f"Symbol '{symbol}' not found")
+    negative_cache.save()
+
+
+def load_map_snapshot(headers: Dict[str, str], snapshot_file: str = MAP_SNAPSHOT_FILE,
+                      max_age: int = MAP_SNAPSHOT_MAX_AGE) -> List[Dict[str, Any]]:
+    """Load the full /map listing from disk, downloading all pages again when the snapshot is stale"""
+    snapshot = []
+    if os.path.exists(snapshot_file):
+        try:
+            with open(snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except Exception:
+            snapshot = []
+
+        if snapshot and time.time() - os.path.getmtime(snapshot_file) < max_age:
+            return snapshot
+
+    url = 'https://pro-api.coinmarketcap.com/v1/cryptocurrency/map'
+    entries = []
+    start = 1
+    while True:
+        response = make_api_request(url, headers, {'start': start, 'limit': MAP_PAGE_SIZE})
+        if not response or response.status_code != 200:
+            # Keep using the stale snapshot rather than an incomplete listing
+            print(f"Could not download CoinMarketCap map page starting at {start}")
+            return snapshot
+
+        page = response.json().get('data') or []
+        entries.extend(page)
+        if len(page) < MAP_PAGE_SIZE:
+            break
+        start += MAP_PAGE_SIZE
+
+    with open(snapshot_file, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False)
+    print(f"Saved CoinMarketCap map snapshot with {len(entries)} assets to {snapshot_file}")
+
+    return entries
+
+
+def build_map_index(map_entries: List[Dict[str, Any]]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Index map entries by lowercase name, symbol, slug and token address"""
+    index = {
+        'by_name': {},
+        'by_symbol': {},
+        'by_slug': {},
+        'by_address': {}
+    }
 
-def save_results_to_file(enhanced_data: List[Dict[str, Any]], timestamp: str,
-                         current_index: int, total: int, batch_size: int) -> None:
-    """Save intermediate results to file"""
-    intermediate_file = f'enhanced_crypto_data_intermediate_{timestamp}.json'
-    with open(intermediate_file, 'w', encoding='utf-8') as f:
-        json.dump(enhanced_data, f, indent=2, ensure_ascii=False)
+    # Visit the best ranked assets first so they win on duplicate keys
+    def rank(coin):
+        return coin.get('rank') or float('inf')
+
+    for coin in sorted(map_entries, key=rank):
+        platform = coin.get('platform') or {}
+        keys = [
+            ('by_name', coin.get('name')),
+            ('by_symbol', coin.get('symbol')),
+            ('by_slug', coin.get('slug')),
+            ('by_address', platform.get('token_address'))
+        ]
+        for index_name, key in keys:
+            if key:
+                index[index_name].setdefault(str(key).strip().lower(), coin)
+
+    return index
+
+
+def prefetch_map_metadata(data: List[Dict[str, Any]], map_index: Dict[str, Dict[str, Dict[str, Any]]],
+                          name_index: Dict[str, Any], url: str, headers: Dict[str, str],
+                          metadata_cache: Dict[str, Dict[str, Any]],
+                          chunk_size: int = SYMBOL_BATCH_SIZE, fetch: Callable = None) -> None:
+    """Fill the address and name caches from the map indexes using bulk /info requests by id"""
+    address_ids = {}
+    name_ids = {}
+
+    for entry in data:
+        address = entry.get('Address', '').strip()
+        symbol = entry.get('Symbol', '').strip()
+        name = entry.get('Name', '').strip()
+
+        address_resolved = False
+        if address and address != "Not found" and address not in metadata_cache['by_address']:
+            coin = map_index['by_address'].get(address.lower())
+            if coin:
+                address_ids[address] = str(coin['id'])
+                address_resolved = True
+
+        # Names are only needed when neither the address nor the symbol resolved
+        if address_resolved or metadata_cache['by_symbol'].get(symbol):
+            continue
+        if name and name != "Not found" and name not in metadata_cache['by_name']:
+            # Exact name first, then the best fuzzy candidate (e.g. "XRP (Ripple)" -> "XRP")
+            coin = map_index['by_name'].get(name.lower()) or best_match(name_index, name)
+            if coin:
+                name_ids[name] = str(coin['id'])
+
+    ids = list(address_ids.values()) + list(name_ids.values())
+    if not ids:
+        return
+
+    print(f"Fetching metadata for {len(set(ids))} assets matched by address or name...")
+    results = (fetch or fetch_in_chunks)(url, headers, 'id', ids, chunk_size)
+
+    for address, coin_id in address_ids.items():
+        metadata_cache['by_address'][address] = results.get(coin_id)
+    for name, coin_id in name_ids.items():
+        if results.get(coin_id):
+            metadata_cache['by_name'][name] = results[coin_id]
+
+
+def split_chunks(values: List[str], chunk_size: int) -> List[List[str]]:
+    """Split values into chunks of chunk_size, dropping duplicates"""
+    unique_values = list(dict.fromkeys(values))
+    return [unique_values[start:start + chunk_size] for start in range(0, len(unique_values), chunk_size)]
+
+
+def fetch_chunk(url: str, headers: Dict[str, str], param_name: str, chunk: List[str],
+                failed: List[str] = None) -> Dict[str, Any]:
+    """
+    Request one comma-separated chunk and return its 'data' mapping
+
+    Values whose request failed for a reason other than being invalid (HTTP 400)
+    are appended to `failed`, so callers can tell "not found" from "not answered".
+    """
+    parameters = {param_name: ','.join(chunk), 'skip_invalid': 'true'}
+    response = make_api_request(url, headers, parameters)
+
+    if response and response.status_code == 200:
+        return response.json().get('data') or {}
+
+    if response is None or response.status_code != 400:
+        # Bad key, rate limit or outage: splitting would only multiply the failing requests
+        if failed is not None:
+            failed.extend(chunk)
+        return {}
+
+    if len(chunk) > 1:
+        # One bad value fails the whole request - split the chunk to isolate it
+        middle = len(chunk) // 2
+        results = fetch_chunk(url, headers, param_name, chunk[:middle], failed)
+        results.update(fetch_chunk(url, headers, param_name, chunk[middle:], failed))
+        return results
+
+    return {}
+
+
+def fetch_in_chunks(url: str, headers: Dict[str, str], param_name: str, values: List[str],
+                    chunk_size: int, failed: List[str] = None) -> Dict[str, Any]:
+    """Request many ids/symbols per call and return the merged 'data' mapping"""
+    results = {}
+    for chunk in split_chunks(values, chunk_size):
+        results.update(fetch_chunk(url, headers, param_name, chunk, failed))
+    return results
+
+
+def open_checkpoint(checkpoint_file: str):
+    """Open a JSONL checkpoint for appending, repairing a last line cut off by a crash"""
+    if os.path.exists(checkpoint_file) and os.path.getsize(checkpoint_file) > 0:
+        with open(checkpoint_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+        if needs_newline:
+            with open(checkpoint_file, 'a', encoding='utf-8') as f:
+                f.write('\n')
+    return open(checkpoint_file, 'a', encoding='utf-8')
+
+
+def append_checkpoint(checkpoint, entry: Dict[str, Any], coin_id: Optional[str],
+                      row_not_found: List[Dict[str, Any]], row_corrections: List[Dict[str, Any]],
+                      sync: bool = False) -> None:
+    """Append one completed row to the checkpoint, forcing it to disk when sync is set"""
+    record = {
+        "Row": entry['Row'],
+        "Entry": entry,
+        "CoinId": coin_id,
+        "NotFound": row_not_found,
+        "Corrections": row_corrections
+    }
+    checkpoint.write(json.dumps(record, ensure_ascii=False) + '\n')
+    checkpoint.flush()
+    if sync:
+        os.fsync(checkpoint.fileno())
 
 
-def handle_rate_limiting(rate_limit: Dict[str, Any]) -> None:
-    """Handle API rate limiting"""
-    current_time = time.time()
-    if current_time - rate_limit['start_time'] > 60:
-        rate_limit['count'] = 0
-        rate_limit['start_time'] = current_time
+def close_checkpoint(checkpoint) -> None:
+    checkpoint.flush()
+    os.fsync(checkpoint.fileno())
+    checkpoint.close()
 
-    if rate_limit['count'] >= rate_limit['per_minute']:
-        wait_time = 60 - (current_time - rate_limit['start_time'])
-        if wait_time > 0:
-            time.sleep(wait_time)
-            rate_limit['count'] = 0
-            rate_limit['start_time'] = time.time()
 
+def load_checkpoint(checkpoint_file: str) -> Dict[int, Dict[str, Any]]:
+    """Read completed rows from a checkpoint, keyed by Row; a partial last line is ignored"""
+    completed_rows = {}
+    if not checkpoint_file or not os.path.exists(checkpoint_file):
+        return completed_rows
 
-def make_api_request(url: str, headers: Dict[str, str], params: Dict[str, Any],
-                     rate_limit: Dict[str, Any]) -> Optional[requests.Response]:
-    """Make an API request with rate limiting and error handling"""
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        rate_limit['count'] += 1
+    with open(checkpoint_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                completed_rows[record['Row']] = record
+            except (ValueError, KeyError, TypeError):
+                continue
 
-        # Handle 429 rate limit
-        if response.status_code == 429:
-            time.sleep(60)
-            response = requests.get(url, headers=headers, params=params)
-            rate_limit['count'] = 1
-            rate_limit['start_time'] = time.time()
+    print(f"Resuming: {len(completed_rows)} rows already completed in {checkpoint_file}")
+    return completed_rows
 
-        return response
+
+def restore_checkpoint_record(record: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str], List, List]:
+    """Return (entry, coin_id, not_found, corrections) saved for a completed row"""
+    return record['Entry'], record.get('CoinId'), record.get('NotFound', []), record.get('Corrections', [])
+
+
+def make_api_request(url: str, headers: Dict[str, str], params: Dict[str, Any]) -> Optional[requests.Response]:
+    """Make an API request with rate limiting and error handling"""
+    try:
+        # Served from the on-disk cache when fresh, otherwise paced by the shared limiter
+        return cached_get(url, params=params, headers=headers)
     except Exception as e:
         return None
 
@@ -392,22 +784,93 @@ def process_quotes_data(entry: Dict[str, Any], crypto_data: Dict[str, Any]) -> N
 
 
 def merge_with_existing_data(current_data: List[Dict[str, Any]], existing_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Merge data from existing JSON with current data"""
-    # Create lookup dictionaries for faster access
-    existing_by_symbol = {}
-    existing_by_address = {}
-    existing_by_name = {}
+    """
+    Merge data from existing JSON with current data
+
+    Each row is matched by Row, then address, symbol and name. Symbols and names
+    only match when exactly one existing record has them, and no match counts if
+    the address, symbol or blockchain known on both sides disagree. Missing fields
+    are filled from the match, and rows that end up with all COMPLETE_FIELDS are
+    flagged '_complete' so the enhancement loop skips them.
+    """
+    # Create lookup dictionaries for faster access, each key listing its records in file order
+    existing_by_row = {}
+    lookups = [('Address', str.lower, {}), ('Symbol', str.upper, {}), ('Name', str.lower, {})]
 
-    # Build lookup tables from existing data
     for item in existing_data:
-        symbol = item.get('Symbol', '').strip
-    
-    # Note: This function appears to be incomplete in the original code
+        if item.get('Row') is not None:
+            existing_by_row.setdefault(item['Row'], item)
+        for field, normalize, lookup in lookups:
+            value = item.get(field)
+            if not is_missing(value):
+                lookup.setdefault(normalize(str(value).strip()), []).append(item)
+
+    def identifier(field, value):
+        value = str(value).strip().lower()
+        return CHAIN_ALIASES.get(value, value) if field == 'Blockchain' else value
+
+    def conflicts(entry, item):
+        # A match only counts if the identifiers known on both sides agree
+        for field in ['Address', 'Symbol', 'Blockchain']:
+            ours, theirs = entry.get(field), item.get(field)
+            if not is_missing(ours) and not is_missing(theirs) and identifier(field, ours) != identifier(field, theirs):
+                return True
+        return False
+
+    def find_match(entry):
+        match = existing_by_row.get(entry['Row'])
+        if match is not None and not conflicts(entry, match):
+            return match
+
+        for field, normalize, lookup in lookups:
+            value = entry.get(field)
+            if is_missing(value):
+                continue
+            candidates = lookup.get(normalize(str(value).strip()), [])
+            # A symbol or name shared by several assets (e.g. USDT on each chain) says nothing about this row
+            if field != 'Address' and len(candidates) != 1:
+                continue
+            for candidate in candidates:
+                if not conflicts(entry, candidate):
+                    return candidate
+        return None
+
+    matched = 0
+    complete = 0
+    for entry in current_data:
+        match = find_match(entry)
+        if match is None:
+            continue
+        matched += 1
+
+        # Fill only what is missing in the current row
+        for field, value in match.items():
+            if field in ('Row', 'Reason') or field.startswith('_') or is_missing(value):
+                continue
+            if is_missing(entry.get(field)):
+                entry[field] = value
+
+        if all(not is_missing(entry.get(field)) for field in COMPLETE_FIELDS):
+            entry['_complete'] = True
+            complete += 1
+
+    print(f"Matched {matched} rows with existing data, {complete} already complete")
     return current_data
 
 
-def process_crypto_data(excel_file: str, api_key: str, existing_json_file: str = None, batch_size: int = 10) -> List[Dict[str, Any]]:
-    """Main function to process crypto data from Excel and enhance it with API data"""
+def process_crypto_data(excel_file: str, api_key: str, existing_json_file: str = None, batch_size: int = 10,
+                        concurrent: bool = False, max_concurrency: int = MAX_CONCURRENCY,
+                        resume_file: str = None, output_file: str = None,
+                        status: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """
+    Main function to process crypto data from Excel and enhance it with API data
+
+    Pass the checkpoint of an interrupted run as resume_file to skip its completed rows.
+    The final records go to output_file (default crypto_data_final_<timestamp>).
+    status['completed'] tells whether the scan finished or was interrupted.
+    """
+    status = {} if status is None else status
+    status['completed'] = False
     if not os.path.exists(excel_file):
         return []
 
@@ -420,8 +883,7 @@ def process_crypto_data(excel_file: str, api_key: str, existing_json_file: str =
     existing_data = []
     if existing_json_file and os.path.exists(existing_json_file):
         try:
-            with open(existing_json_file, 'r', encoding='utf-8') as f:
-                existing_data = json.load(f)
+            existing_data = read_records(existing_json_file)
 
             # Merge existing data with extracted data where appropriate
             extracted_data = merge_with_existing_data(extracted_data, existing_data)
@@ -429,13 +891,18 @@ def process_crypto_data(excel_file: str, api_key: str, existing_json_file: str =
             pass
 
     # Enhance data with CoinMarketCap API
-    result = enhance_with_coinmarketcap(extracted_data, api_key, batch_size)
-
-    # Save a final single JSON file with all the data
+    resume = bool(resume_file)
+    if concurrent:
+        result = asyncio.run(enhance_with_coinmarketcap_async(extracted_data, api_key, batch_size, max_concurrency,
+                                                              checkpoint_file=resume_file, resume=resume,
+                                                              status=status))
+    else:
+        result = enhance_with_coinmarketcap(extracted_data, api_key, batch_size,
+                                            checkpoint_file=resume_file, resume=resume, status=status)
+
+    # Save a final single typed record file with all the data
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    final_file = f'crypto_data_final_{timestamp}.json'
-    with open(final_file, 'w', encoding='utf-8') as f:
-        json.dump(result, f, indent=2, ensure_ascii=False)
+    write_records(output_file or store_path('crypto_data_final', timestamp), result)
     
     return result
 
@@ -452,15 +919,17 @@ def coinmarketcap_scan():
     
     existing_json_file = None
     if use_existing_data:
-        existing_json_file = input("Enter path to existing JSON data file: ").strip()
+        existing_json_file = input("Enter path to existing data file (.json, .jsonl.gz or .parquet): ").strip()
     
     try:
-        batch_size_input = input("Enter batch size for intermediate saves [default: 10]: ").strip()
+        batch_size_input = input("Enter number of rows between checkpoint syncs [default: 10]: ").strip()
         batch_size = int(batch_size_input) if batch_size_input else 10
     except ValueError:
         batch_size = 10
+
+    resume_file = input("Enter checkpoint file to resume from (leave empty to start fresh): ").strip() or None
     
-    result = process_crypto_data(excel_file, api_key, existing_json_file, batch_size)
+    result = process_crypto_data(excel_file, api_key, existing_json_file, batch_size, resume_file=resume_file)
     
     print("===== Process completed =====")
 
@@ -1,95 +1,125 @@
+import heapq
 import json
 import os
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from Coingecko_Scanner import coingecko
-from Eth_Bnb_Scanner import etherscan_bnb
+from Coingecko_Scanner import coingecko, lookup_coin_by_name
+from Eth_Bnb_Scanner import etherscan_bnb, lookup_token_rows, resolve_rows_onchain
 from Coinmarketcap_Scanner import process_crypto_data
+from Onchain_Token_Resolver import RPC_URLS
+from Source_Router import SourceRouter, is_present
+from Sheet_Loader import load_sheet, excel_row_numbers
+from Excel_Writer import write_rows_xlsx
+from Typed_Store import is_missing, missing_mask, iter_records, read_records, write_records, store_path
+from Pipeline_Manifest import PipelineManifest, run_stage, existing_files, file_digest, stage_key
 
 
-def merge_json_data(json_files, priority_order=None):
+class UnsortedSourceError(ValueError):
+    """A record stream that has to be in Row order is not"""
+
+
+def iter_source_rows(json_file, source_index, presort=False):
     """
-    Merge data from multiple JSON files with priority handling
-    
-    Parameters:
-        json_files (list): List of JSON file paths
-        priority_order (list): List of file prefixes in order of priority (highest first)
-        
-    Returns:
-        list: Merged data with priority handling
+    Yield (row, source index, record) from one source file in row order
+
+    Sources are expected to be sorted by Row (all scanners write them that way);
+    an out-of-order record raises UnsortedSourceError unless presort=True, which sorts the
+    source in memory first.
+    """
+    records = iter_records(json_file)
+    count = 0
+    last_row = None
+    try:
+        if presort:
+            records = sorted((record for record in records if record.get('Row') is not None),
+                             key=lambda record: record['Row'])
+
+        for record in records:
+            row_num = record.get('Row')
+            if row_num is None:
+                continue
+            if last_row is not None and row_num < last_row:
+                raise UnsortedSourceError(f"{json_file} is not sorted by Row (row {row_num} after {last_row})")
+            last_row = row_num
+            count += 1
+            yield row_num, source_index, record
+    except (OSError, EOFError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        # A damaged source ends early; rows read so far still count
+        print(f"Error reading JSON file {json_file}: {str(e)}")
+
+    print(f"Loaded {count} records from {json_file}")
+
+
+def iter_merged_records(json_files, priority_order=None, presort=False):
+    """
+    Merge row-sorted JSON sources k-way by Row and yield one merged record per row
+
+    Within a row a field is taken from the highest-priority source that has it,
+    ties going to the source listed first. Memory use is one row per source.
     """
     if priority_order is None:
         # Default priority: Etherscan/BSCScan > CoinGecko
         priority_order = ["token_info", "missing_symbols"]
-        
-    # Create a map of priority values (lower number = higher priority)
-    priority_map = {prefix: i for i, prefix in enumerate(priority_order)}
-    
-    # Read all JSON files
-    all_data = []
+
+    streams = []
+    priorities = []
     for json_file in json_files:
         if not os.path.exists(json_file):
             print(f"Warning: JSON file not found: {json_file}")
             continue
-            
-        try:
-            # Determine source priority based on filename
-            source_priority = 999  # Default low priority
-            for prefix in priority_map:
-                if prefix in json_file:
-                    source_priority = priority_map[prefix]
-                    break
-                    
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            # Tag each record with its source and priority
-            for record in data:
-                record['_source_file'] = json_file
-                record['_priority'] = source_priority
-                
-            all_data.extend(data)
-            print(f"Loaded {len(data)} records from {json_file}")
-        except Exception as e:
-            print(f"Error reading JSON file {json_file}: {str(e)}")
-    
-    # Group by row number
-    row_data = {}
-    for record in all_data:
-        row_num = record.get('Row')
-        if row_num is None:
-            continue
-            
-        # Initialize this row if not already present
-        if row_num not in row_data:
-            row_data[row_num] = {}
-            
-        # Get priority of this record
-        priority = record.get('_priority', 999)
-        
-        # Update fields based on priority
+        priorities.append(source_priority(json_file, priority_order))
+        streams.append(iter_source_rows(json_file, len(streams), presort))
+
+    current_row = None
+    merged = {}
+    field_priority = {}
+    for row_num, source_index, record in heapq.merge(*streams, key=lambda item: (item[0], item[1])):
+        if row_num != current_row:
+            if current_row is not None:
+                yield merged
+            current_row = row_num
+            merged = {}
+            field_priority = {}
+
+        priority = priorities[source_index]
         for field, value in record.items():
             # Skip metadata fields
             if field.startswith('_'):
                 continue
-                
             # If field doesn't exist yet, or this record has higher priority, update it
-            current_priority = row_data[row_num].get(f"_{field}_priority", 1000)
-            if field not in row_data[row_num] or priority < current_priority:
-                row_data[row_num][field] = value
-                row_data[row_num][f"_{field}_priority"] = priority
-    
-    # Convert back to list format
-    merged_data = []
-    for row_num, data in row_data.items():
-        # Remove priority metadata
-        clean_data = {k: v for k, v in data.items() if not k.startswith('_')}
-        merged_data.append(clean_data)
-    
-    # Sort by row number
-    merged_data.sort(key=lambda x: x.get('Row', 0))
+            if field not in merged or priority < field_priority[field]:
+                merged[field] = value
+                field_priority[field] = priority
+
+    if current_row is not None:
+        yield merged
+
+
+def merge_json_data(json_files, priority_order=None):
+    """
+    Merge data from multiple JSON files with priority handling
     
-    return merged_data
+    Parameters:
+        json_files (list): List of JSON file paths
+        priority_order (list): List of file prefixes in order of priority (highest first)
+        
+    Returns:
+        list: Merged data with priority handling, sorted by row
+    """
+    try:
+        return list(iter_merged_records(json_files, priority_order))
+    except UnsortedSourceError as e:
+        print(f"{str(e)} - sorting sources in memory before merging")
+        return list(iter_merged_records(json_files, priority_order, presort=True))
+
+
+def source_priority(json_file, priority_order):
+    """Priority of a source file by the first prefix it contains (lower number = higher priority)"""
+    for i, prefix in enumerate(priority_order):
+        if prefix in json_file:
+            return i
+    return 999  # Default low priority
 
 
 def create_intermediate_excel(excel_file, merged_data, output_file=None):
@@ -98,7 +128,7 @@ def create_intermediate_excel(excel_file, merged_data, output_file=None):
     
     Parameters:
         excel_file (str): Path to the original Excel file
-        merged_data (list): List of merged data records
+        merged_data (iterable): Merged data records, a list or a stream
         output_file (str, optional): Path to save the updated Excel file
         
     Returns:
@@ -109,8 +139,8 @@ def create_intermediate_excel(excel_file, merged_data, output_file=None):
         output_file = f"intermediate_crypto_data_{timestamp}.xlsx"
     
     try:
-        # Read the original Excel file
-        excel_data = pd.read_excel(excel_file, sheet_name="Assets missing info")
+        # Read the original Excel file (a copy of the shared frame, since it is updated below)
+        excel_data = load_sheet(excel_file).copy()
         print(f"Read Excel file with {len(excel_data)} rows")
         
         # Create dictionary to map row numbers to DataFrame indices
@@ -148,27 +178,31 @@ def create_intermediate_excel(excel_file, merged_data, output_file=None):
         
         print(f"Column mapping: {column_mapping}")
         
-        # Update Excel with merged data
+        # Merged values by sheet position, one column per mapped field, sentinels as nulls
+        fields = list(column_mapping)
+        merged = pd.DataFrame.from_records(merged_data, columns=['Row'] + fields)
+        in_sheet = merged['Row'].isin(row_to_index)
+        for row_num in merged.loc[~in_sheet, 'Row']:
+            print(f"Warning: Row {row_num} not found in Excel")
+        merged = merged[in_sheet]
+        values = merged[fields].mask(missing_mask(merged[fields]))
+        # For rows listed more than once the first meaningful value wins
+        values = values.groupby(merged['Row'].map(row_to_index)).first()
+        values = values.reindex(excel_data.index)
+
+        # Update Excel with merged data, filling only the empty cells of each mapped column
         update_count = 0
-        for item in merged_data:
-            row_num = item.get('Row')
-            if row_num not in row_to_index:
-                print(f"Warning: Row {row_num} not found in Excel")
-                continue
-                
-            index = row_to_index[row_num]
-            
-            # Update each mapped field
-            for field, col in column_mapping.items():
-                if field in item and item[field] not in ["Not found", "Error", "Not available", ""]:
-                    # Only update if cell is empty or value is more reliable
-                    current_value = excel_data.at[index, col]
-                    if pd.isna(current_value) or str(current_value).strip() == "":
-                        excel_data.at[index, col] = item[field]
-                        update_count += 1
+        for field, col in column_mapping.items():
+            current = excel_data[col]
+            empty = current.isna() | current.astype(str).str.strip().eq("")
+            fill = empty & values[field].notna()
+            update_count += int(fill.sum())
+            # Object dtype, so text can go into columns pandas read as numeric
+            excel_data[col] = current.astype(object).mask(fill, values[field])
         
-        # Save updated Excel
-        excel_data.to_excel(output_file, sheet_name="Assets missing info", index=False)
+        # Save updated Excel; values stay as they are, the CoinMarketCap step reads them back
+        write_rows_xlsx(output_file, columns, excel_data.itertuples(index=False, name=None),
+                        numeric_columns=set())
         print(f"Updated {update_count} cells in Excel file")
         print(f"Saved intermediate Excel to {output_file}")
         
@@ -179,34 +213,325 @@ def create_intermediate_excel(excel_file, merged_data, output_file=None):
         return excel_file  # Return original file path on error
 
 
-def save_merged_to_json(merged_data, output_file=None):
+def iter_records_by_row(final_data):
+    """
+    Yield final records in Row order
+
+    Lists are sorted here; any other iterable (e.g. iter_records) is streamed
+    and must already be sorted, otherwise UnsortedSourceError is raised.
+    """
+    if isinstance(final_data, list):
+        yield from sorted(final_data, key=lambda item: item.get('Row') or 0)
+        return
+
+    last_row = None
+    for item in final_data:
+        row_num = item.get('Row') or 0
+        if last_row is not None and row_num < last_row:
+            raise UnsortedSourceError(f"Final data is not sorted by Row (Row {row_num} after {last_row})")
+        last_row = row_num
+        yield item
+
+
+def create_final_excel(excel_file, final_data, output_file):
+    """
+    Write the final CoinMarketCap data over the original sheet
+
+    Every meaningful value replaces the cell in the column of the same name
+    (case-insensitive); the CoinMarketCap-only columns are added to the sheet.
+    final_data is a list or a stream of records sorted by Row; sheet rows and
+    records are merged as they are written, so only one output row is held in
+    memory. Numeric CoinMarketCap columns are stored as numbers.
+    """
+    # The original sheet gives the structure (read-only, rows are copied as written)
+    original_df = load_sheet(excel_file)
+
+    # Add new columns for additional CoinMarketCap data
+    new_columns = [
+        "MarketCap", "CirculatingSupply", "MaxSupply", "Volume24h",
+        "PercentChange24h", "PercentChange7d", "PercentChange30d",
+        "Network", "Slug", "DateAdded", "Tags"
+    ]
+    header = original_df.columns.tolist()
+    header += [col for col in new_columns if col not in header]
+
+    # Position of the first column for each lowercase field name
+    column_map = {}
+    for position, col in enumerate(header):
+        column_map.setdefault(col.lower(), position)
+
+    counts = {'updates': 0}
+    padding = [None] * (len(header) - len(original_df.columns))
+
+    def merged_rows():
+        records = iter_records_by_row(final_data)
+        pending = next(records, None)
+
+        for position, row in enumerate(original_df.itertuples(index=False, name=None)):
+            row_num = position + 2
+            values = list(row) + padding
+
+            # Records for rows before this one are not in the sheet
+            while pending is not None and (pending.get('Row') or 0) < row_num:
+                pending = next(records, None)
+
+            # A later record for the same row wins
+            while pending is not None and pending.get('Row') == row_num:
+                for field, value in pending.items():
+                    if field == "Row":
+                        continue
+                    col = column_map.get(field.lower())
+                    # Only update if value is meaningful
+                    if col is not None and not is_missing(value):
+                        values[col] = value
+                        counts['updates'] += 1
+                pending = next(records, None)
+
+            yield values
+
+        # Drain the stream so an unsorted tail is still reported
+        for _ in records:
+            pass
+
+    write_rows_xlsx(output_file, header, merged_rows())
+
+    print(f"Updated {counts['updates']} cells in final Excel file")
+    print(f"Saved final Excel to {output_file}")
+    return output_file
+
+
+def save_merged_data(merged_data, output_file=None):
     """
-    Save merged data to a JSON file
+    Save merged data as a typed record file (see Typed_Store)
     
     Parameters:
-        merged_data (list): List of merged data records
-        output_file (str, optional): Path to save the JSON file
+        merged_data (iterable): Merged data records, a list or a stream
+        output_file (str, optional): Path to save the records
         
     Returns:
-        str: Path to the saved JSON file
+        str: Path to the saved file
     """
     if output_file is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = f"merged_crypto_data_{timestamp}.json"
+        output_file = store_path("merged_crypto_data", timestamp)
     
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(merged_data, f, indent=2, ensure_ascii=False)
+        write_records(output_file, merged_data)
         print(f"Saved merged data to {output_file}")
         return output_file
+    except UnsortedSourceError:
+        # Left to the caller, which can retry with sorted sources
+        raise
     except Exception as e:
         print(f"Error saving merged data: {str(e)}")
         return None
 
 
+def routed_collection(excel_file, output_file="routed_results.json"):
+    """
+    Collect missing data with the adaptive source router instead of running every scanner
+
+    Each row goes to the source with the lowest expected cost for its row type
+    (address, symbol or name only) and only moves on to the next source on a miss.
+
+    Returns:
+        str: Path to the saved JSON file, or None if nothing was collected
+    """
+    df = load_sheet(excel_file)
+    fields = ["Blockchain", "Name", "Symbol", "Address"]
+    frame = df.iloc[:, :4].copy()
+    frame.columns = fields
+    present = frame.apply(lambda column: column.map(is_present))
+
+    # Rows the CoinGecko or explorer scanners would pick up
+    needs_lookup = ~(present["Symbol"] & present["Blockchain"] & present["Address"])
+    mask = needs_lookup & (present["Name"] | present["Address"])
+
+    selected = frame[mask].astype(object).where(frame[mask].notna(), "")
+    selected.insert(0, "Row", excel_row_numbers(df)[mask])
+    rows = selected.to_dict('records')
+
+    if not rows:
+        print("No rows need data collection.")
+        return None
+
+    def token_row(record):
+        return [record["Row"], record["Blockchain"], record["Symbol"], record["Address"]]
+
+    def resolve_onchain(records):
+        resolved = resolve_rows_onchain([token_row(record) for record in records])
+        return [resolved.get(i) for i in range(len(records))]
+
+    resolvers = {
+        'onchain': (
+            lambda record: is_present(record["Address"]) and record["Blockchain"] in RPC_URLS,
+            resolve_onchain
+        ),
+        'explorer': (
+            lambda record: is_present(record["Address"]) and record["Blockchain"] in ('Ethereum', 'BNB Smart Chain'),
+            lambda records: lookup_token_rows([token_row(record) for record in records])
+        ),
+        'coingecko': (
+            lambda record: is_present(record["Name"]),
+            lambda records: [lookup_coin_by_name(record["Row"], record["Name"], record["Symbol"] or None)
+                             for record in records]
+        )
+    }
+
+    router = SourceRouter()
+    results = router.route(rows, resolvers)
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Saved {len(results)} routed results to {output_file}")
+    return output_file
+
+
+# Collection result files, lower index = higher priority when merging
+SOURCE_PRIORITY = ["routed", "token_info", "missing_symbols"]
+COLLECTION_FILES = ["missing_symbols_results.json", "token_info_results.json"]
+
+# Part of every stage's config: bump a stage's version when a code change alters what it writes,
+# so its recorded outputs stop counting as current
+STAGE_VERSIONS = {
+    'collect': '1',
+    'merge': '1',
+    'intermediate_excel': '1',
+    'cmc': '1',
+    'final_excel': '1'
+}
+
+
+def collect_sources(excel_file, use_router):
+    """
+    Run data collection and return the result files it produced as {path: path}
+
+    The router handles every row itself; otherwise CoinGecko and Etherscan/BSCScan
+    run concurrently (separate hosts with separate rate limits). Returns None
+    unless every collector succeeded and wrote its file, so a partial collection
+    is not recorded as done and runs again next time.
+    """
+    if use_router:
+        print("\nRunning routed data collection...")
+        try:
+            routed_file = routed_collection(excel_file)
+        except Exception as e:
+            print(f"Error running routed data collection: {str(e)}")
+            return None
+        return {routed_file: routed_file} if routed_file and os.path.exists(routed_file) else None
+
+    collectors = {
+        "missing_symbols_results.json": ("CoinGecko", coingecko),
+        "token_info_results.json": ("Blockchain Explorer", etherscan_bnb)
+    }
+    print("\nRunning CoinGecko and Blockchain Explorer data collection concurrently...")
+    outputs = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=len(collectors)) as executor:
+        futures = {executor.submit(collector): json_file
+                   for json_file, (_, collector) in collectors.items()}
+
+        for future in as_completed(futures):
+            json_file = futures[future]
+            label = collectors[json_file][0]
+            try:
+                records = future.result()
+            except Exception as e:
+                print(f"Error running {label} collection: {str(e)}")
+                failed.append(label)
+                continue
+            if records is None or not os.path.exists(json_file):
+                print(f"{label} collection did not produce results")
+                failed.append(label)
+                continue
+
+            outputs[json_file] = json_file
+            print(f"\n{label} collection finished with {len(records)} records")
+
+    if failed:
+        print(f"Collection failed for {', '.join(failed)} - run the workflow again to retry it")
+        return None
+    return outputs
+
+
+def merge_stage(json_files, output_file):
+    """Merge the collection results by priority, streaming the merged rows into a typed record file"""
+    print("\nMerging data from JSON files with Etherscan/BSCScan priority...")
+    try:
+        merged_file = save_merged_data(iter_merged_records(json_files, SOURCE_PRIORITY), output_file)
+    except UnsortedSourceError as e:
+        print(f"{str(e)} - sorting sources in memory before merging")
+        merged_file = save_merged_data(iter_merged_records(json_files, SOURCE_PRIORITY, presort=True), output_file)
+    return {'merged': merged_file} if merged_file else None
+
+
+def intermediate_stage(excel_file, merged_file, output_file):
+    """Fill the empty cells of the sheet from the merged data"""
+    print("\nCreating intermediate Excel file...")
+    result = create_intermediate_excel(excel_file, read_records(merged_file), output_file)
+    # On error the original sheet path comes back
+    return {'excel': result} if result == output_file else None
+
+
+def cmc_checkpoint_path(inputs, config):
+    """
+    Checkpoint of the cmc stage, named after its stage key (sheet and merged data digests plus config)
+
+    An interrupted stage resumes from it on the next run; a changed sheet, merged
+    data or config gets a fresh checkpoint, so rows are never restored across them.
+    """
+    key = stage_key('cmc', {label: file_digest(path) for label, path in inputs.items()}, config)
+    return f"enhanced_crypto_data_checkpoint_{key[:16]}.jsonl"
+
+
+def coinmarketcap_stage(intermediate_excel, merged_file, output_file, batch_size, checkpoint_file):
+    """
+    Enrich the intermediate sheet with CoinMarketCap; asks for the API key only when it runs
+
+    Returns outputs only for a scan that finished, so an interrupted one is not
+    recorded as done and the next run resumes it from its checkpoint.
+    """
+    print("\nNow processing with CoinMarketCap (most comprehensive data)...")
+    api_key = input("Enter your CoinMarketCap API key: ").strip()
+
+    if not api_key:
+        print("API key is required for CoinMarketCap integration.")
+        return None
+
+    status = {}
+    try:
+        process_crypto_data(intermediate_excel, api_key, merged_file, batch_size,
+                            resume_file=checkpoint_file, output_file=output_file, status=status)
+    except Exception as e:
+        print(f"Error in CoinMarketCap processing: {str(e)}")
+        return None
+
+    if not status.get('completed'):
+        print(f"CoinMarketCap scan did not finish - the next run resumes from {checkpoint_file}")
+        return None
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    return {'final': output_file} if os.path.exists(output_file) else None
+
+
+def final_excel_stage(excel_file, final_file, output_file):
+    """Write the final CoinMarketCap data over the original sheet, streaming the records"""
+    print("\nCreating final Excel file with all collected data...")
+    try:
+        create_final_excel(excel_file, iter_records(final_file), output_file)
+    except UnsortedSourceError as e:
+        print(f"{str(e)}, sorting final data in memory")
+        create_final_excel(excel_file, read_records(final_file), output_file)
+    return {'excel': output_file}
+
+
 def combined_crypto_workflow():
     """
     Main function to execute the complete crypto data workflow
+
+    Each stage (collect, merge, intermediate_excel, cmc, final_excel) is skipped
+    when the content of its inputs and its config match its last run, as recorded
+    in pipeline_manifest.json. Set PIPELINE_FORCE to re-run stages anyway.
     """
     print("===== Comprehensive Crypto Data Integration Workflow =====")
     
@@ -216,143 +541,71 @@ def combined_crypto_workflow():
     if not os.path.exists(excel_file):
         print(f"Error: Excel file not found: {excel_file}")
         return
+
+    manifest = PipelineManifest()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     # Step 2: Ask if user wants to run data collection
-    run_collection = input("Do you want to run data collection from CoinGecko and Blockchain Explorers? (y/n) [default: y]: ").strip().lower()
-    run_collection = run_collection in ["", "y", "yes", "1"]
-    
-    json_files = []
-    
-    # Step 3: Run CoinGecko collection if requested
-    if run_collection:
-        print("\nRunning CoinGecko data collection...")
-        try:
-            coingecko()
-            json_files.append("missing_symbols_results.json")
-        except Exception as e:
-            print(f"Error running CoinGecko collection: {str(e)}")
-    else:
-        if os.path.exists("missing_symbols_results.json"):
-            json_files.append("missing_symbols_results.json")
-    
-    # Step 4: Run Etherscan/BSCScan collection if requested
-    if run_collection:
-        print("\nRunning Blockchain Explorer data collection...")
-        try:
-            etherscan_bnb()
-            json_files.append("token_info_results.json")
-        except Exception as e:
-            print(f"Error running Blockchain Explorer collection: {str(e)}")
+    run_collection = input("Do you want to run data collection from CoinGecko and Blockchain Explorers? "
+                           "(y/n) [default: only if the sheet changed]: ").strip().lower()
+
+    if run_collection in ["n", "no", "0"]:
+        # Use the result files of earlier runs as they are
+        collected = existing_files(COLLECTION_FILES)
     else:
-        if os.path.exists("token_info_results.json"):
-            json_files.append("token_info_results.json")
+        # Steps 3-4: Optionally let the source router pick a source per row instead of running every scanner
+        use_router = input("Route each row to the cheapest source (on-chain, explorer, CoinGecko)? (y/n) [default: n]: ").strip().lower()
+        use_router = use_router in ["y", "yes", "1"]
+
+        collected = run_stage(manifest, 'collect', {'sheet': excel_file},
+                              {'version': STAGE_VERSIONS['collect'], 'router': use_router},
+                              lambda: collect_sources(excel_file, use_router),
+                              force=run_collection in ["y", "yes", "1"])
     
     # Check if we have any JSON files
-    if not json_files:
+    if not collected:
         print("No JSON files found. Please run data collection first.")
         return
     
     # Step 5: Merge JSON data with priority
-    print("\nMerging data from JSON files with Etherscan/BSCScan priority...")
-    merged_data = merge_json_data(json_files, ["token_info", "missing_symbols"])
-    
-    # Save merged data (optional, for debugging)
-    merged_json = save_merged_to_json(merged_data)
+    merged = run_stage(manifest, 'merge', collected,
+                       {'version': STAGE_VERSIONS['merge'], 'priority_order': SOURCE_PRIORITY},
+                       lambda: merge_stage(list(collected.values()), store_path("merged_crypto_data", timestamp)))
+    if not merged:
+        return
+    merged_file = merged['merged']
     
     # Step 6: Create intermediate Excel with merged data
-    print("\nCreating intermediate Excel file...")
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    intermediate_excel = create_intermediate_excel(
-        excel_file, 
-        merged_data, 
-        f"intermediate_crypto_data_{timestamp}.xlsx"
-    )
-    
-    # Step 7: Ask for CoinMarketCap API key
-    print("\nNow processing with CoinMarketCap (most comprehensive data)...")
-    api_key = input("Enter your CoinMarketCap API key: ").strip()
+    intermediate = run_stage(manifest, 'intermediate_excel', {'sheet': excel_file, 'merged': merged_file},
+                             {'version': STAGE_VERSIONS['intermediate_excel']},
+                             lambda: intermediate_stage(excel_file, merged_file,
+                                                        f"intermediate_crypto_data_{timestamp}.xlsx"))
+    if not intermediate:
+        return
+    intermediate_excel = intermediate['excel']
     
-    if not api_key:
-        print("API key is required for CoinMarketCap integration.")
+    # Steps 7-8: Process with CoinMarketCap
+    batch_size = 10  # Default batch size
+    # Keyed on what the intermediate sheet is built from rather than the xlsx itself, whose
+    # bytes change with its creation time on every rebuild
+    cmc_inputs = {'sheet': excel_file, 'merged': merged_file}
+    cmc_config = {'version': STAGE_VERSIONS['cmc'],
+                  'intermediate_version': STAGE_VERSIONS['intermediate_excel'],
+                  'batch_size': batch_size}
+    final = run_stage(manifest, 'cmc', cmc_inputs, cmc_config,
+                      lambda: coinmarketcap_stage(intermediate_excel, merged_file,
+                                                  store_path("crypto_data_final", timestamp), batch_size,
+                                                  cmc_checkpoint_path(cmc_inputs, cmc_config)))
+    if not final:
         return
     
-    # Step 8: Process with CoinMarketCap
-    try:
-        batch_size = 10  # Default batch size
-        final_data = process_crypto_data(intermediate_excel, api_key, merged_json, batch_size)
-        
-        # Final timestamp for output files
-        final_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        
-        # Find the most recent final JSON file from CoinMarketCap process
-        # (it creates files with timestamp in name)
-        cmk_json_files = [f for f in os.listdir() if f.startswith("crypto_data_final_")]
-        if cmk_json_files:
-            latest_cmk_file = max(cmk_json_files, key=os.path.getctime)
-            print(f"\nFound final CoinMarketCap data file: {latest_cmk_file}")
-        
-        # Step 9: Create final Excel with all data
-        print("\nCreating final Excel file with all collected data...")
-        
-        # Read the original Excel to preserve structure
-        original_df = pd.read_excel(excel_file, sheet_name="Assets missing info")
-        
-        # Load the final JSON data from CoinMarketCap
-        final_json_path = f"crypto_data_final_{final_timestamp}.json"
-        if os.path.exists(final_json_path):
-            with open(final_json_path, 'r', encoding='utf-8') as f:
-                final_data = json.load(f)
-        elif cmk_json_files:
-            with open(latest_cmk_file, 'r', encoding='utf-8') as f:
-                final_data = json.load(f)
-        
-        # Create row mapping
-        row_to_index = {row + 2: row for row in range(len(original_df))}
-        
-        # Add new columns for additional CoinMarketCap data
-        new_columns = [
-            "MarketCap", "CirculatingSupply", "MaxSupply", "Volume24h", 
-            "PercentChange24h", "PercentChange7d", "PercentChange30d", 
-            "Network", "Slug", "DateAdded", "Tags"
-        ]
-        
-        for col in new_columns:
-            if col not in original_df.columns:
-                original_df[col] = None
-        
-        # Update the DataFrame with final data
-        update_count = 0
-        for item in final_data:
-            row_num = item.get('Row')
-            if row_num not in row_to_index:
-                continue
-                
-            index = row_to_index[row_num]
-            
-            # Update all columns
-            for field, value in item.items():
-                if field == "Row":
-                    continue
-                    
-                # Try to find matching column
-                matching_cols = [col for col in original_df.columns if col.lower() == field.lower()]
-                
-                if matching_cols:
-                    col = matching_cols[0]
-                    # Only update if value is meaningful
-                    if value not in ["Not found", ""]:
-                        original_df.at[index, col] = value
-                        update_count += 1
-        
-        # Save final Excel
-        final_excel_path = f"crypto_data_complete_{final_timestamp}.xlsx"
-        original_df.to_excel(final_excel_path, sheet_name="Assets missing info", index=False)
-        
-        print(f"Updated {update_count} cells in final Excel file")
-        print(f"Saved final Excel to {final_excel_path}")
-        
-    except Exception as e:
-        print(f"Error in CoinMarketCap processing: {str(e)}")
+    # Step 9: Create final Excel with all data
+    complete = run_stage(manifest, 'final_excel', {'sheet': excel_file, 'final': final['final']},
+                         {'version': STAGE_VERSIONS['final_excel']},
+                         lambda: final_excel_stage(excel_file, final['final'],
+                                                   f"crypto_data_complete_{timestamp}.xlsx"))
+    if complete:
+        print(f"\nFinal Excel file: {complete['excel']}")
 
 
 if __name__ == "__main__":
@@ -1,42 +1,81 @@
-import requests
 import time
-import pandas as pd
 import os
-import random
 import json
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from Rate_Limiter import shared_limiter, rate_limited_get
+from Response_Cache import cached_get, CachedResponse, get_cache_mode, get_shared_cache, request_key, ttl_for
+from Response_Archive import get_archive_mode
+from Negative_Cache import get_negative_cache
+from Explorer_Page_Parser import is_valid_price, parse_token_page, extract_token_fields_fast
+from Onchain_Token_Resolver import resolve_tokens
+from Sheet_Loader import load_sheet, excel_row_numbers
 
 # Constants
-DELAY_BETWEEN_CALLS = 2  # seconds between network requests
-MAX_RETRIES = 3
-
-
-def is_valid_price(price_str):
-    """Validates if a string contains a price."""
-    if not price_str:
-        return False
-    has_digit = any(char.isdigit() for char in price_str)
-    price_indicators = ['$', '€', '£', 'usd', 'eur', 'gbp']
-    has_currency = any(indicator in price_str.lower() for indicator in price_indicators)
-    return has_digit or has_currency
-
-
-def parse_name_price(text):
-    """Splits text by '|' separator and identifies name vs price."""
-    if '|' not in text:
-        return text, ""
-
-    parts = text.split('|')
-    part1 = parts[0].strip()
-    part2 = parts[1].strip() if len(parts) > 1 else ""
-
-    # Determine which part is the price
-    if is_valid_price(part1) and not is_valid_price(part2):
-        return part2, part1
-    elif is_valid_price(part2) and not is_valid_price(part1):
-        return part1, part2
-    else:
-        return part1, part2
+MAX_RETRIES = 3  # request pacing per explorer host comes from the shared rate limiter
+EXPLORER_WORKERS_PER_HOST = 2  # concurrent page requests per explorer host
+STREAM_EXPLORER_PAGES = True  # stop downloading a token page once its header has arrived
+STREAM_CHUNK_SIZE = 16 * 1024
+DEFAULT_RESOLVER = os.environ.get('TOKEN_RESOLVER', 'explorer')  # 'explorer' or 'onchain'
+
+
+def fetch_token_page(url, params=None, headers=None):
+    """
+    Streams an explorer page and stops reading once the h1 token header is complete.
+
+    Returns the received prefix as a CachedResponse marked truncated (so it is not
+    cached), or the whole body if the header never shows up. While recording the
+    response archive the whole page is always read, so replay sees every section
+    the parser can fall back on. Non-200 responses are returned unread.
+    """
+    response = rate_limited_get(url, params=params, headers=headers, stream=True)
+    if response.status_code != 200:
+        return response
+
+    content = bytearray()
+    truncated = False
+    stop_early = get_archive_mode() != 'record'
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            scan_from = max(0, len(content) - 4)
+            content.extend(chunk)
+            # Only re-check the page once a closing h1 tag has arrived
+            if (stop_early and content.find(b'</h1', scan_from) != -1
+                    and extract_token_fields_fast(bytes(content), use_title=False)):
+                truncated = True
+                break
+    finally:
+        response.close()
+
+    page = CachedResponse(url, response.status_code, dict(response.headers), bytes(content))
+    page.from_cache = False
+    page.truncated = truncated
+    return page
+
+
+def token_fields_key(url):
+    """Cache key of the (symbol, name, price) parsed from a streamed token page"""
+    return request_key(url, {'fields': 'symbol,name,price'})
+
+
+def get_cached_token_fields(url):
+    """(symbol, name, price) stored for a token page by an earlier streamed download, or None"""
+    if get_cache_mode() != 'use' or get_archive_mode() == 'replay':
+        return None
+    hit = get_shared_cache().get(token_fields_key(url), ttl_for(url))
+    return tuple(hit.json()) if hit is not None else None
+
+
+def store_token_fields(url, fields):
+    """
+    Cache the fields parsed from a streamed page, whose truncated body is not cached itself
+
+    Stored under its own key and a '#fields' URL, so the page entry keeps meaning a
+    whole page for the archive and the parse benchmark.
+    """
+    if get_cache_mode() == 'bypass' or get_archive_mode() == 'replay':
+        return
+    get_shared_cache().put(token_fields_key(url), f"{url}#fields", 200, {},
+                           json.dumps(list(fields)).encode('utf-8'))
 
 
 def get_token_symbol_from_blockchain_explorer(contract_address, network):
@@ -52,105 +91,39 @@ def get_token_symbol_from_blockchain_explorer(contract_address, network):
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
 
+    # Pages that had no token data recently are not fetched again until the entry expires
+    negative_cache = get_negative_cache()
+    miss_key = f"{network}:{str(contract_address).lower()}"
+    if negative_cache.is_known_miss('explorer', miss_key):
+        return "", "", ""
+
+    cached_fields = get_cached_token_fields(base_url)
+    if cached_fields:
+        return cached_fields
+
     for attempt in range(MAX_RETRIES):
         try:
-            response = requests.get(base_url, headers=headers)
+            # Cached token pages are reused; misses are paced and retried on 429 by the shared limiter
+            # and, when streaming, only downloaded up to the token header
+            response = cached_get(base_url, headers=headers,
+                                  fetch=fetch_token_page if STREAM_EXPLORER_PAGES else None)
 
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-
-                # Method 1: Look for the main h1 title
-                h1_element = soup.find('h1', class_='mb-1')
-                if h1_element:
-                    title_text = h1_element.text.strip()
-                    if '(' in title_text and ')' in title_text:
-                        full_name = title_text.split('(')[0].strip()
-                        symbol = title_text.split('(')[1].split(')')[0].strip()
-                        name, price = parse_name_price(full_name)
-                        return symbol, name, price
-
-                # Method 2: Search in token profile area
-                profile_boxes = soup.find_all('div', class_='col-md-8')
-                token_name = ""
-                token_symbol = ""
-                token_price = ""
-
-                for box in profile_boxes:
-                    labels = box.find_all('div', class_='col-md-4')
-                    values = box.find_all('div', class_='col-md-8')
-
-                    for i, label in enumerate(labels):
-                        if i < len(values):
-                            label_text = label.text.strip()
-                            value_text = values[i].text.strip()
-
-                            if "Symbol" in label_text:
-                                token_symbol = value_text
-                            if "Name" in label_text:
-                                token_name, token_price = parse_name_price(value_text)
-
-                if token_symbol:
-                    return token_symbol, token_name, token_price
-
-                # Method 3: Search page title
-                title_element = soup.find('title')
-                if title_element:
-                    title_text = title_element.text.strip()
-                    if " Token Tracker" in title_text:
-                        name_part = title_text.split(" Token Tracker")[0].strip()
-                        if '(' in name_part and ')' in name_part:
-                            full_name = name_part.split('(')[0].strip()
-                            symbol = name_part.split('(')[1].split(')')[0].strip()
-                            name, price = parse_name_price(full_name)
-                            return symbol, name, price
-
-                # Method 4: Search within HTML
-                html_text = response.text
-                symbol_matches = []
-                name_matches = []
-                html_price = ""
-
-                # Search for symbol in HTML
-                if "symbol:" in html_text.lower():
-                    parts = html_text.lower().split("symbol:")
-                    if len(parts) > 1:
-                        potential_symbols = parts[1].split(',')[0]
-                        clean_symbol = ''.join([c for c in potential_symbols if c.isalnum()])[:10]
-                        if clean_symbol:
-                            symbol_matches.append(clean_symbol.upper())
-
-                # Search for name in HTML
-                html_name = ""
-                if "name:" in html_text.lower():
-                    parts = html_text.lower().split("name:")
-                    if len(parts) > 1:
-                        potential_name = parts[1]
-                        for delimiter in ['"', "'"]:
-                            if delimiter in potential_name:
-                                name_part = potential_name.split(delimiter)
-                                if len(name_part) > 1:
-                                    html_name = name_part[1]
-                                    html_name, html_price = parse_name_price(html_name)
-                                    break
-
-                        if html_name:
-                            name_matches.append(html_name)
-
-                if symbol_matches:
-                    symbol = symbol_matches[0]
-                    name = name_matches[0] if name_matches else ""
-                    return symbol, name, html_price
-
+                # Header scan on the raw bytes first, full HTML parse only if that finds nothing
+                result = parse_token_page(response.content)
+                if result:
+                    if getattr(response, 'truncated', False):
+                        store_token_fields(base_url, result)
+                    return result
+
+                negative_cache.record_miss('explorer', miss_key, 'no_data', "No token symbol on explorer page")
                 return "", "", ""
 
-            elif response.status_code == 429:  # Rate limit
-                wait_time = (attempt + 1) * 5 + random.uniform(1, 5)
-                time.sleep(wait_time)
             else:
                 break
 
         except Exception:
-            time.sleep(DELAY_BETWEEN_CALLS)
+            time.sleep(shared_limiter.backoff(attempt))
 
     return "", "", ""
 
@@ -160,25 +133,19 @@ def extract_tokens_from_excel(file_path):
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
 
-    try:
-        df = pd.read_excel(file_path, header=None)
-        filtered_df = df[((df[0] == 'Ethereum') | (df[0] == 'BNB Smart Chain')) & (df[3].notna())].copy()
-        filtered_df['excel_row'] = filtered_df.index + 1
-
-        result = []
-        for _, row in filtered_df.iterrows():
-            network = row[0]
-            existing_symbol = row[2] if pd.notna(row[2]) else ""
-            contract_address = row[3]
-            excel_row = int(row['excel_row'])
-
-            # Add to list only rows without existing symbol
-            if not existing_symbol:
-                result.append([excel_row, network, existing_symbol, contract_address])
-
-        return result
-    except Exception as e:
-        raise e
+    # Columns by position: blockchain, name, symbol, address
+    df = load_sheet(file_path, 0)
+    network = df.iloc[:, 0]
+    symbol = df.iloc[:, 2]
+    address = df.iloc[:, 3]
+
+    # Ethereum/BNB rows with an address and without an existing symbol
+    mask = network.isin(['Ethereum', 'BNB Smart Chain']) & address.notna() & \
+        (symbol.isna() | (symbol.astype(str) == ""))
+
+    return [[int(excel_row), row_network, "", contract_address]
+            for excel_row, row_network, contract_address
+            in zip(excel_row_numbers(df)[mask], network[mask], address[mask])]
 
 
 def parse_row_selection(selection, max_row):
@@ -209,8 +176,109 @@ def parse_row_selection(selection, max_row):
     return sorted(list(selected_rows))
 
 
-def get_symbols_for_tokens(input_file, row_selection=None):
-    """Processes Excel rows to retrieve token information."""
+def lookup_token_row(row_data):
+    """Looks up one [row, network, symbol, address] entry and builds its result record."""
+    row_num, network, _, contract_address = row_data
+    symbol, name, price = get_token_symbol_from_blockchain_explorer(contract_address, network)
+
+    result = {
+        "Row": row_num,
+        "Name": name,
+        "Symbol": symbol if symbol else "Not found",
+        "Blockchain": network,
+        "Address": contract_address,
+        "Price": price if price and is_valid_price(price) else "Not available"
+    }
+
+    if not symbol:
+        result["Reason"] = "Symbol not found"
+
+    if price and not is_valid_price(price):
+        # If price doesn't look valid, it might be part of the name
+        result["Name"] = f"{result['Name']} {price}".strip()
+        result["Price"] = "Not available"
+
+    return result
+
+
+def resolve_rows_onchain(token_rows):
+    """Resolves rows through contract calls, returns {row index: result record} for resolved rows."""
+    results = {}
+    for network in sorted({row[1] for row in token_rows}):
+        indices = [idx for idx, row in enumerate(token_rows) if row[1] == network]
+        print(f"Resolving {len(indices)} {network} contracts via JSON-RPC...")
+        resolved = resolve_tokens([token_rows[idx][3] for idx in indices], network)
+
+        for idx in indices:
+            row_num, _, _, contract_address = token_rows[idx]
+            token = resolved.get(str(contract_address).strip().lower())
+            if token:
+                results[idx] = {
+                    "Row": row_num,
+                    "Name": token['name'],
+                    "Symbol": token['symbol'],
+                    "Blockchain": network,
+                    "Address": contract_address,
+                    # Contracts carry no price
+                    "Price": "Not available",
+                    "Decimals": token['decimals']
+                }
+
+    print(f"Resolved {len(results)} of {len(token_rows)} contracts on-chain")
+    return results
+
+
+def lookup_token_rows(token_rows, concurrent=True, done=0, total=None):
+    """
+    Looks up rows on the explorers, returns result records in the order of token_rows.
+
+    With concurrent=True each explorer host gets its own thread pool of
+    EXPLORER_WORKERS_PER_HOST workers, so Ethereum and BNB rows are scraped in
+    parallel; each host is still paced by its budget in the shared rate limiter.
+    """
+    total = total or len(token_rows)
+    results = [None] * len(token_rows)
+
+    if not concurrent:
+        # Process each row
+        for idx, row_data in enumerate(token_rows):
+            done += 1
+            # Print progress update
+            print(f"Row {row_data[0]} ({done}/{total}): Processing asset...")
+            results[idx] = lookup_token_row(row_data)
+        return results
+
+    # One pool per explorer host so a slow host does not hold up the other
+    executors = {network: ThreadPoolExecutor(max_workers=EXPLORER_WORKERS_PER_HOST,
+                                             thread_name_prefix=f"explorer-{network}")
+                 for network in {row_data[1] for row_data in token_rows}}
+    try:
+        futures = {executors[row_data[1]].submit(lookup_token_row, row_data): idx
+                   for idx, row_data in enumerate(token_rows)}
+
+        for future in as_completed(futures):
+            idx = futures[future]
+            results[idx] = future.result()
+            done += 1
+            print(f"Row {token_rows[idx][0]} ({done}/{total}): Processed asset")
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return results
+
+
+def get_symbols_for_tokens(input_file, row_selection=None, concurrent=True, resolver=DEFAULT_RESOLVER):
+    """
+    Processes Excel rows to retrieve token information.
+
+    With resolver='onchain' names and symbols are first read from the contracts
+    with batched eth_call (see Onchain_Token_Resolver); only rows the node could
+    not resolve are looked up on the explorer.
+
+    Explorer lookups run through lookup_token_rows, concurrently per host unless
+    concurrent=False. Results keep the input row order.
+    """
     all_token_rows = extract_tokens_from_excel(input_file)
     if not all_token_rows:
         return []
@@ -219,80 +287,66 @@ def get_symbols_for_tokens(input_file, row_selection=None):
 
     # Process row selection
     if row_selection is not None:
-        selected_row_numbers = parse_row_selection(row_selection, max_row)
+        selected_row_numbers = set(parse_row_selection(row_selection, max_row))
         token_rows = [row for row in all_token_rows if row[0] in selected_row_numbers]
     else:
         token_rows = all_token_rows
 
-    tokens_info_list = []
     total_rows = len(token_rows)
+    results = [None] * total_rows
 
-    # Process each row
-    for idx, row_data in enumerate(token_rows):
-        row_num, network, _, contract_address = row_data
-        # Print progress update
-        print(f"Row {row_num} ({idx+1}/{total_rows}): Processing asset...")
-        
-        symbol, name, price = get_token_symbol_from_blockchain_explorer(contract_address, network)
-
-        result = {
-            "Row": row_num,
-            "Name": name,
-            "Symbol": symbol if symbol else "Not found",
-            "Blockchain": network,
-            "Address": contract_address,
-            "Price": price if price and is_valid_price(price) else "Not available"
-        }
-
-        if not symbol:
-            result["Reason"] = "Symbol not found"
+    # Rows the node resolved skip the explorer; the rest fall back to scraping
+    if resolver == 'onchain':
+        for idx, result in resolve_rows_onchain(token_rows).items():
+            results[idx] = result
+    pending = [idx for idx in range(total_rows) if results[idx] is None]
 
-        if price and not is_valid_price(price):
-            # If price doesn't look valid, it might be part of the name
-            result["Name"] = f"{result['Name']} {price}".strip()
-            result["Price"] = "Not available"
+    explorer_results = lookup_token_rows([token_rows[idx] for idx in pending], concurrent=concurrent,
+                                         done=total_rows - len(pending), total=total_rows)
+    for idx, result in zip(pending, explorer_results):
+        results[idx] = result
 
-        tokens_info_list.append(result)
-        time.sleep(DELAY_BETWEEN_CALLS)
-
-    return tokens_info_list
+    get_negative_cache().save()
+    return [result for result in results if result is not None]
 
 
 def etherscan_bnb():
-    """Main function that processes tokens and saves results."""
+    """Main function that processes tokens and saves results. Returns the results, or None on error."""
     print("=== Blockchain Token Symbol and Name Extractor ===")
 
     input_file = "Fireblocks_Task__-_assets_with_missing_info.xlsx"
 
     if not os.path.exists(input_file):
         print(f"Error: File not found: {input_file}")
-        exit(1)
+        return None
 
     all_rows = extract_tokens_from_excel(input_file)
     if not all_rows:
         print("No Ethereum/BNB Smart Chain tokens with addresses found in the Excel file.")
-        exit(0)
+        tokens_info = []
+    else:
+        print(f"Found {len(all_rows)} Ethereum/BNB Smart Chain tokens with addresses and missing symbols.")
 
-    print(f"Found {len(all_rows)} Ethereum/BNB Smart Chain tokens with addresses and missing symbols.")
-    
-    # Process all rows without asking user
-    row_selection = None
+        # Process all rows without asking user
+        row_selection = None
 
-    start_time = time.time()
-    tokens_info = get_symbols_for_tokens(input_file, row_selection=row_selection)
+        start_time = time.time()
+        tokens_info = get_symbols_for_tokens(input_file, row_selection=row_selection)
 
-    print(f"\nEstimated runtime: {time.time() - start_time:.2f} seconds")
-    print(f"Found info for {len(tokens_info)} tokens")
+        print(f"\nEstimated runtime: {time.time() - start_time:.2f} seconds")
+        print(f"Found info for {len(tokens_info)} tokens")
 
-    # Save results to JSON
-    if tokens_info:
-        results_file = "token_info_results.json"
-        try:
-            with open(results_file, 'w', encoding='utf-8') as f:
-                json.dump(tokens_info, f, indent=2, ensure_ascii=False)
-            print(f"Results saved to {results_file}")
-        except Exception as e:
-            print(f"Error saving results: {str(e)}")
+    # Save results to JSON, also when empty so results of an earlier run are not mistaken for this one's
+    results_file = "token_info_results.json"
+    try:
+        with open(results_file, 'w', encoding='utf-8') as f:
+            json.dump(tokens_info, f, indent=2, ensure_ascii=False)
+        print(f"Results saved to {results_file}")
+    except Exception as e:
+        print(f"Error saving results: {str(e)}")
+        return None
+
+    return tokens_info
 
 
 # Main execution
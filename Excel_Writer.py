@@ -0,0 +1,70 @@
+import json
+import math
+from typing import Any, Iterable, List
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+# Columns written as numbers when their value parses as one
+NUMERIC_COLUMNS = {
+    "Price", "MarketCap", "CirculatingSupply", "MaxSupply", "Volume24h",
+    "PercentChange24h", "PercentChange7d", "PercentChange30d"
+}
+
+
+def to_number(value: Any) -> Any:
+    """Parse values like '12.5', '$0.53' or '1,234' into a float, or return the value unchanged"""
+    if not isinstance(value, str):
+        return value
+    text = value.strip().lstrip('$').replace(',', '')
+    try:
+        number = float(text)
+    except ValueError:
+        return value
+    return number if math.isfinite(number) else value
+
+
+def to_cell_value(value: Any, numeric: bool = False) -> Any:
+    """Convert a record or DataFrame value into something openpyxl can store"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return to_number(value) if numeric else value
+
+
+def write_rows_xlsx(output_file: str, header: List[str], rows: Iterable[Iterable[Any]],
+                    sheet_name: str = "Assets missing info", numeric_columns: set = None) -> int:
+    """
+    Stream rows into a write-only workbook, returns the number of data rows written
+
+    Each row is converted and handed to openpyxl as it arrives, so memory stays
+    flat however many rows there are. Values in numeric_columns that parse as
+    numbers are stored as real numbers instead of text.
+    """
+    numeric_columns = NUMERIC_COLUMNS if numeric_columns is None else numeric_columns
+    numeric_flags = [column in numeric_columns for column in header]
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(list(header))
+
+    count = 0
+    try:
+        for row in rows:
+            sheet.append([to_cell_value(value, numeric) for value, numeric in zip(row, numeric_flags)])
+            count += 1
+    except Exception:
+        # Finish the partly written sheet so openpyxl releases its temporary file
+        sheet.close()
+        raise
+
+    workbook.save(output_file)
+    return count
@@ -0,0 +1,180 @@
+import html
+import re
+from typing import Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+# One pass over the raw page finds the <title> and the first <h1>s; the name
+# header sits near the top of the body, so the scan stops early on real pages
+HEADER_PATTERN = re.compile(rb'<(title|h1)\b([^>]*)>(.*?)</\1\s*>', re.IGNORECASE | re.DOTALL)
+MB1_CLASS_PATTERN = re.compile(rb'''class\s*=\s*["'][^"']*\bmb-1\b''', re.IGNORECASE)
+TAG_PATTERN = re.compile(rb'<[^>]+>')
+
+# Marker of the token profile rows the full parse looks at before the title
+PROFILE_MARKER = b'col-md-4'
+
+
+def is_valid_price(price_str):
+    """Validates if a string contains a price."""
+    if not price_str:
+        return False
+    has_digit = any(char.isdigit() for char in price_str)
+    price_indicators = ['$', '€', '£', 'usd', 'eur', 'gbp']
+    has_currency = any(indicator in price_str.lower() for indicator in price_indicators)
+    return has_digit or has_currency
+
+
+def parse_name_price(text):
+    """Splits text by '|' separator and identifies name vs price."""
+    if '|' not in text:
+        return text, ""
+
+    parts = text.split('|')
+    part1 = parts[0].strip()
+    part2 = parts[1].strip() if len(parts) > 1 else ""
+
+    # Determine which part is the price
+    if is_valid_price(part1) and not is_valid_price(part2):
+        return part2, part1
+    elif is_valid_price(part2) and not is_valid_price(part1):
+        return part1, part2
+    else:
+        return part1, part2
+
+
+def split_title(title_text):
+    """Splits 'Name (SYMBOL)' into (symbol, name, price), or None without parentheses."""
+    if '(' in title_text and ')' in title_text:
+        full_name = title_text.split('(')[0].strip()
+        symbol = title_text.split('(')[1].split(')')[0].strip()
+        name, price = parse_name_price(full_name)
+        return symbol, name, price
+    return None
+
+
+def element_text(raw):
+    """Text of an element's raw inner HTML, tags removed and entities decoded."""
+    return html.unescape(TAG_PATTERN.sub(b'', raw).decode('utf-8', errors='replace')).strip()
+
+
+def extract_token_fields_fast(content: bytes, use_title: bool = True) -> Optional[Tuple[str, str, str]]:
+    """
+    Cheap scan of raw page bytes for the h1.mb-1 header and the <title>
+
+    Returns (symbol, name, price), or None when the page needs the full parse.
+    With use_title=False only the h1 header counts, which is safe on a partial page.
+    """
+    title_raw = None
+    for match in HEADER_PATTERN.finditer(content):
+        tag = match.group(1).lower()
+        if tag == b'title':
+            if title_raw is None:
+                title_raw = match.group(3)
+        elif MB1_CLASS_PATTERN.search(match.group(2)):
+            # Only the first h1.mb-1 counts, as in the full parse
+            result = split_title(element_text(match.group(3)))
+            if result:
+                return result
+            break
+
+    # The profile rows take precedence over the title, so leave those pages to the full parse
+    if use_title and title_raw is not None and PROFILE_MARKER not in content:
+        title_text = element_text(title_raw)
+        if " Token Tracker" in title_text:
+            return split_title(title_text.split(" Token Tracker")[0].strip())
+
+    return None
+
+
+def extract_token_fields_soup(html_text: str) -> Optional[Tuple[str, str, str]]:
+    """Full BeautifulSoup parse of an explorer page, returns (symbol, name, price) or None."""
+    soup = BeautifulSoup(html_text, 'html.parser')
+
+    # Method 1: Look for the main h1 title
+    h1_element = soup.find('h1', class_='mb-1')
+    if h1_element:
+        result = split_title(h1_element.text.strip())
+        if result:
+            return result
+
+    # Method 2: Search in token profile area
+    profile_boxes = soup.find_all('div', class_='col-md-8')
+    token_name = ""
+    token_symbol = ""
+    token_price = ""
+
+    for box in profile_boxes:
+        labels = box.find_all('div', class_='col-md-4')
+        values = box.find_all('div', class_='col-md-8')
+
+        for i, label in enumerate(labels):
+            if i < len(values):
+                label_text = label.text.strip()
+                value_text = values[i].text.strip()
+
+                if "Symbol" in label_text:
+                    token_symbol = value_text
+                if "Name" in label_text:
+                    token_name, token_price = parse_name_price(value_text)
+
+    if token_symbol:
+        return token_symbol, token_name, token_price
+
+    # Method 3: Search page title
+    title_element = soup.find('title')
+    if title_element:
+        title_text = title_element.text.strip()
+        if " Token Tracker" in title_text:
+            result = split_title(title_text.split(" Token Tracker")[0].strip())
+            if result:
+                return result
+
+    # Method 4: Search within HTML
+    return extract_token_fields_text(html_text)
+
+
+def segment_after(text, marker):
+    """Text between the first and second occurrence of marker, or None if marker is absent."""
+    start = text.find(marker)
+    if start == -1:
+        return None
+    start += len(marker)
+    end = text.find(marker, start)
+    return text[start:end] if end != -1 else text[start:]
+
+
+def extract_token_fields_text(html_text: str) -> Optional[Tuple[str, str, str]]:
+    """Last resort: look for 'symbol:' and 'name:' in the page source."""
+    lowered = html_text.lower()
+
+    # Search for symbol in HTML
+    symbol = ""
+    potential_symbols = segment_after(lowered, "symbol:")
+    if potential_symbols is not None:
+        clean_symbol = ''.join([c for c in potential_symbols.split(',', 1)[0] if c.isalnum()])[:10]
+        symbol = clean_symbol.upper()
+
+    if not symbol:
+        return None
+
+    # Search for name in HTML
+    html_name = ""
+    html_price = ""
+    potential_name = segment_after(lowered, "name:")
+    if potential_name is not None:
+        for delimiter in ['"', "'"]:
+            if delimiter in potential_name:
+                name_part = potential_name.split(delimiter, 2)
+                html_name = name_part[1]
+                html_name, html_price = parse_name_price(html_name)
+                break
+
+    return symbol, html_name, html_price
+
+
+def parse_token_page(content: bytes) -> Optional[Tuple[str, str, str]]:
+    """Extracts (symbol, name, price) from an explorer token page, fast path first."""
+    result = extract_token_fields_fast(content)
+    if result:
+        return result
+    return extract_token_fields_soup(content.decode('utf-8', errors='replace'))
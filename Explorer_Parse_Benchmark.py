@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import tracemalloc
+
+from Explorer_Page_Parser import extract_token_fields_soup, parse_token_page
+from Response_Cache import CACHE_FILE, ResponseCache
+
+
+def load_saved_pages(source):
+    """Loads explorer pages from a directory of .html files or from the response cache."""
+    pages = []
+    if os.path.isdir(source):
+        for file_name in sorted(os.listdir(source)):
+            if file_name.endswith(('.html', '.htm')):
+                with open(os.path.join(source, file_name), 'rb') as f:
+                    pages.append((file_name, f.read()))
+    elif os.path.exists(source):
+        cache = ResponseCache(source)
+        rows = cache._db.execute(
+            "SELECT url, body FROM responses WHERE (url LIKE '%etherscan.io/token/%' OR url LIKE '%bscscan.com/token/%')"
+            " AND url NOT LIKE '%#fields'"
+        ).fetchall()
+        # Skip header-only prefixes that older streamed runs left in the cache
+        pages = [(url, bytes(body)) for url, body in rows if b'</html' in bytes(body[-4096:]).lower()]
+    return pages
+
+
+def measure(parse, pages):
+    """Runs parse over every page, returns (results, seconds per page, peak bytes per page)."""
+    results = []
+    seconds = 0.0
+    peak = 0
+    for _, content in pages:
+        tracemalloc.start()
+        start = time.perf_counter()
+        results.append(parse(content))
+        seconds += time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return results, seconds / len(pages), peak
+
+
+def run_benchmark(source=CACHE_FILE):
+    """Compares the fast-path extractor with the full BeautifulSoup parse on saved pages."""
+    pages = load_saved_pages(source)
+    if not pages:
+        print(f"No saved explorer pages found in {source}")
+        return
+
+    print(f"Parsing {len(pages)} saved explorer pages from {source}")
+    full_results, full_time, full_peak = measure(
+        lambda content: extract_token_fields_soup(content.decode('utf-8', errors='replace')), pages)
+    fast_results, fast_time, fast_peak = measure(parse_token_page, pages)
+
+    mismatches = [name for (name, _), full, fast in zip(pages, full_results, fast_results) if full != fast]
+
+    print(f"Full parse: {full_time * 1000:.2f} ms/page, peak {full_peak / 1024:.0f} KB")
+    print(f"Fast path:  {fast_time * 1000:.2f} ms/page, peak {fast_peak / 1024:.0f} KB")
+    if fast_time > 0:
+        print(f"Speed-up: {full_time / fast_time:.1f}x")
+    print(f"Pages with different results: {len(mismatches)}")
+    for name in mismatches[:10]:
+        print(f"  {name}")
+
+
+if __name__ == "__main__":
+    run_benchmark(sys.argv[1] if len(sys.argv) > 1 else CACHE_FILE)
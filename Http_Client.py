@@ -0,0 +1,84 @@
+import os
+import threading
+from typing import Dict, Any
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Seconds to establish a connection and to wait between bytes of a response
+CONNECT_TIMEOUT = float(os.environ.get('CRYPTO_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.environ.get('CRYPTO_READ_TIMEOUT', 30))
+
+# Keep-alive connections kept open per host
+POOL_SIZE = 10
+
+# Transport-level retries for dropped connections and gateway errors. 429/503 are
+# left to the rate limiter, which honors Retry-After and paces the whole host.
+TRANSPORT_RETRIES = Retry(
+    total=3,
+    connect=3,
+    read=2,
+    status=2,
+    status_forcelist=(500, 502, 504),
+    allowed_methods=frozenset(['GET', 'POST']),
+    backoff_factor=0.5,
+    raise_on_status=False,
+    respect_retry_after_header=False
+)
+
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate'
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def storable_headers(headers: Dict[str, str]) -> Dict[str, str]:
+    """Response headers worth keeping with a stored body; the body is stored decoded,
+    so transfer headers no longer apply"""
+    return {k: v for k, v in dict(headers or {}).items()
+            if k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+
+
+def new_session() -> requests.Session:
+    """Session with a keep-alive connection pool and transport retries"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=TRANSPORT_RETRIES)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    """Return the shared session for a URL's host, creating it on first use"""
+    host = urlparse(url).netloc.lower()
+    with _sessions_lock:
+        if host not in _sessions:
+            _sessions[host] = new_session()
+        return _sessions[host]
+
+
+def http_get(url: str, params: Dict[str, Any] = None, headers: Dict[str, str] = None,
+             timeout=None, **kwargs) -> requests.Response:
+    """GET through the host's pooled session with connect/read timeouts"""
+    return get_session(url).get(url, params=params, headers=headers,
+                                timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+
+
+def http_post(url: str, data=None, json=None, headers: Dict[str, str] = None,
+              timeout=None, **kwargs) -> requests.Response:
+    """POST through the host's pooled session with connect/read timeouts"""
+    return get_session(url).post(url, data=data, json=json, headers=headers,
+                                 timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+
+
+def close_sessions() -> None:
+    """Close all pooled connections"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
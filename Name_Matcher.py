@@ -0,0 +1,104 @@
+import re
+from collections import Counter
+from typing import Dict, List, Any, Tuple
+
+# Minimum similarity for a candidate to be accepted as a match
+DEFAULT_MIN_SCORE = 0.75
+
+# Words that say nothing about which asset is meant
+GENERIC_WORDS = {'token', 'coin', 'the'}
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase a name and reduce it to space separated alphanumeric words"""
+    return ' '.join(re.findall(r'[a-z0-9]+', str(name).lower()))
+
+
+def name_variants(name: str) -> List[str]:
+    """Return the normalized forms of a name worth looking up, e.g. 'XRP (Ripple)' -> full, 'xrp', 'ripple'"""
+    variants = [normalize_name(name)]
+
+    # Names like "XRP (Ripple)" carry two names in one cell
+    outside = re.sub(r'\(.*?\)', ' ', str(name))
+    inside = re.findall(r'\((.*?)\)', str(name))
+    for part in [outside] + inside:
+        variants.append(normalize_name(part))
+
+    # Also try without generic words such as "token"
+    for variant in list(variants):
+        words = [word for word in variant.split() if word not in GENERIC_WORDS]
+        if words:
+            variants.append(' '.join(words))
+
+    return [variant for variant in dict.fromkeys(variants) if variant]
+
+
+def trigrams(text: str) -> set:
+    """Character trigrams of a normalized name, padded so short names still produce some"""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def build_name_index(entries: List[Dict[str, Any]], field: str = 'name') -> Dict[str, Any]:
+    """
+    Precompute an exact-name table and a trigram inverted index over entries
+
+    Entries should be ordered by preference (e.g. market rank), earlier entries win ties.
+    The exact table keeps every entry with a given name, so callers can break ties themselves.
+    """
+    index = {
+        'entries': entries,
+        'exact': {},
+        'postings': {},
+        'sizes': []
+    }
+
+    for position, entry in enumerate(entries):
+        normalized = normalize_name(entry.get(field) or '')
+        index['exact'].setdefault(normalized, []).append(position)
+
+        grams = trigrams(normalized) if normalized else set()
+        index['sizes'].append(len(grams))
+        for gram in grams:
+            index['postings'].setdefault(gram, []).append(position)
+
+    return index
+
+
+def match_name(index: Dict[str, Any], name: str, limit: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    Return up to `limit` (score, entry) candidates for a name, best first, scores between 0 and 1
+
+    Every entry with exactly the name is returned, even beyond `limit`.
+    """
+    best_scores = {}
+
+    for variant in name_variants(name):
+        positions = index['exact'].get(variant)
+        if positions:
+            for position in positions:
+                best_scores[position] = 1.0
+            continue
+
+        query = trigrams(variant)
+        shared = Counter()
+        for gram in query:
+            shared.update(index['postings'].get(gram, ()))
+
+        # Jaccard similarity between the trigram sets
+        for position, count in shared.items():
+            score = count / (len(query) + index['sizes'][position] - count)
+            if score > best_scores.get(position, 0.0):
+                best_scores[position] = score
+
+    exact_hits = sum(1 for score in best_scores.values() if score == 1.0)
+    ranked = sorted(best_scores.items(), key=lambda item: (-item[1], item[0]))[:max(limit, exact_hits)]
+    return [(score, index['entries'][position]) for position, score in ranked]
+
+
+def best_match(index: Dict[str, Any], name: str, min_score: float = DEFAULT_MIN_SCORE) -> Dict[str, Any]:
+    """Return the top candidate for a name if it scores at least min_score, otherwise None"""
+    candidates = match_name(index, name, limit=1)
+    if candidates and candidates[0][0] >= min_score:
+        return candidates[0][1]
+    return None
@@ -0,0 +1,91 @@
+import atexit
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from Response_Archive import is_replay
+from State_Files import load_json_state, save_json_state
+
+NEGATIVE_CACHE_FILE = 'negative_lookups.json'
+
+# Seconds before a remembered miss is checked again, by reason category
+DEFAULT_EXPIRY = {
+    'not_found': 7 * 24 * 60 * 60,   # the source answered and has no such asset
+    'no_data': 3 * 24 * 60 * 60,     # a page was found but had nothing usable on it
+    'error': 60 * 60                 # the source failed to answer
+}
+
+
+class NegativeCache:
+    """
+    Persistent record of lookups that found nothing, per source
+
+    Entries are stored as {source: {key: {category, reason, recorded_at}}} and
+    expire after the time configured for their category.
+    """
+
+    def __init__(self, path: str = NEGATIVE_CACHE_FILE, expiry: Dict[str, float] = None):
+        self.path = path
+        self.expiry = dict(DEFAULT_EXPIRY, **(expiry or {}))
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries = load_json_state(path, 'negative cache', {})
+
+    def get(self, source: str, key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored miss for a key, or None if there is none or it has expired"""
+        # Replays re-run every lookup so changed parsers see the archived pages again
+        if is_replay():
+            return None
+        with self._lock:
+            entry = self._entries.get(source, {}).get(key)
+            if entry is None:
+                return None
+            max_age = self.expiry.get(entry.get('category'), self.expiry['error'])
+            if time.time() - entry.get('recorded_at', 0) > max_age:
+                del self._entries[source][key]
+                self._dirty = True
+                return None
+            return entry
+
+    def is_known_miss(self, source: str, key: str) -> bool:
+        return self.get(source, key) is not None
+
+    def record_miss(self, source: str, key: str, category: str, reason: str) -> None:
+        """Remember that a lookup found nothing"""
+        if is_replay():
+            return
+        with self._lock:
+            self._entries.setdefault(source, {})[key] = {
+                'category': category,
+                'reason': reason,
+                'recorded_at': time.time()
+            }
+            self._dirty = True
+
+    def clear(self, source: str, key: str) -> None:
+        """Forget a miss, e.g. after the asset was found"""
+        with self._lock:
+            if self._entries.get(source, {}).pop(key, None) is not None:
+                self._dirty = True
+
+    def save(self) -> None:
+        """Write the cache to disk if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            save_json_state(self.path, self._entries, ensure_ascii=False)
+            self._dirty = False
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_negative_cache() -> NegativeCache:
+    """Return the process-wide negative cache, saved automatically on exit"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = NegativeCache()
+            atexit.register(_shared_cache.save)
+        return _shared_cache
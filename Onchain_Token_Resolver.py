@@ -0,0 +1,186 @@
+import json
+import os
+from typing import Dict, List, Any, Optional, Union
+
+import requests
+
+from Http_Client import http_post, CONNECT_TIMEOUT
+from Rate_Limiter import shared_limiter
+from Response_Archive import get_archive_mode, get_shared_archive
+from Response_Cache import request_key
+
+# JSON-RPC endpoints per network, overridable for a private node or a local stub
+RPC_URLS = {
+    'Ethereum': os.environ.get('ETH_RPC_URL', 'https://cloudflare-eth.com'),
+    'BNB Smart Chain': os.environ.get('BSC_RPC_URL', 'https://bsc-dataseed.binance.org')
+}
+
+# Contracts per JSON-RPC batch (three eth_call requests each)
+RPC_BATCH_SIZE = 50
+RPC_TIMEOUT = 30
+
+# Returned by rpc_batch when the node refuses the batch as a whole (too large, or batches not allowed)
+BATCH_REJECTED = 'batch rejected'
+
+# Statuses with which a node refuses a batch for its size or form
+REJECTED_STATUSES = (400, 413)
+
+# ERC-20 / BEP-20 function selectors
+SELECTORS = {
+    'name': '0x06fdde03',
+    'symbol': '0x95d89b41',
+    'decimals': '0x313ce567'
+}
+
+
+def decode_string_result(result: Optional[str]) -> str:
+    """Decode an eth_call result holding an ABI string, or a bytes32 as used by older tokens"""
+    if not result or not isinstance(result, str) or len(result) < 66:
+        return ""
+    try:
+        data = bytes.fromhex(result[2:] if result.startswith('0x') else result)
+    except ValueError:
+        return ""
+
+    raw = None
+    if len(data) >= 64:
+        offset = int.from_bytes(data[:32], 'big')
+        if offset + 32 <= len(data):
+            length = int.from_bytes(data[offset:offset + 32], 'big')
+            if offset + 32 + length <= len(data):
+                raw = data[offset + 32:offset + 32 + length]
+    if raw is None:
+        # bytes32, padded with zero bytes
+        raw = data[:32]
+
+    return raw.replace(b'\x00', b'').decode('utf-8', errors='replace').strip()
+
+
+def decode_uint_result(result: Optional[str]) -> Optional[int]:
+    """Decode an eth_call result holding a uint, None if there is none"""
+    if not result or not isinstance(result, str) or len(result) < 66:
+        return None
+    try:
+        return int(result[2:66], 16)
+    except ValueError:
+        return None
+
+
+def build_calls(addresses: List[str]) -> List[Dict[str, Any]]:
+    """One eth_call request per (address, field), ids are positions in the batch"""
+    calls = []
+    for address in addresses:
+        for field, selector in SELECTORS.items():
+            calls.append({
+                'jsonrpc': '2.0',
+                'id': len(calls),
+                'method': 'eth_call',
+                'params': [{'to': address, 'data': selector}, 'latest']
+            })
+    return calls
+
+
+def rpc_batch(rpc_url: str, calls: List[Dict[str, Any]]) -> Union[Dict[int, Any], str, None]:
+    """
+    POST a JSON-RPC batch, return {id: result} for the calls that succeeded
+
+    Returns BATCH_REJECTED when the node refuses the batch itself (HTTP 400/413 or a
+    single error object), and None when it did not answer (connection error,
+    timeout, rate limit, other statuses); Retry-After is passed to the rate limiter.
+    """
+    payload = json.dumps(calls, sort_keys=True)
+    key = request_key(rpc_url, {'batch': payload}, method='POST')
+    archive_mode = get_archive_mode()
+
+    if archive_mode == 'replay':
+        archived = get_shared_archive().get(key)
+        if archived is None:
+            return None
+        status, body = archived[1], archived[3]
+    else:
+        shared_limiter.acquire(rpc_url)
+        try:
+            response = http_post(rpc_url, data=payload, headers={'Content-Type': 'application/json'},
+                                 timeout=(CONNECT_TIMEOUT, RPC_TIMEOUT))
+        except requests.RequestException as e:
+            print(f"RPC request to {rpc_url} failed: {str(e)}")
+            return None
+
+        shared_limiter.update_from_response(rpc_url, response)
+        status, body = response.status_code, response.content
+        if archive_mode == 'record':
+            get_shared_archive().put(key, rpc_url, status, response.headers, body)
+
+    if status in REJECTED_STATUSES:
+        print(f"RPC batch of {len(calls)} calls rejected with status code {status}")
+        return BATCH_REJECTED
+    if status != 200:
+        print(f"RPC batch returned status code {status}")
+        return None
+
+    try:
+        replies = json.loads(body)
+    except ValueError:
+        return None
+    if isinstance(replies, dict) and 'error' in replies:
+        # Nodes that reject batches answer with a single error object
+        return BATCH_REJECTED
+    if not isinstance(replies, list):
+        return None
+
+    return {reply.get('id'): reply.get('result') for reply in replies
+            if isinstance(reply, dict) and 'result' in reply}
+
+
+def resolve_chunk(rpc_url: str, addresses: List[str], resolved: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Resolve one chunk of addresses, splitting it in half when the node rejects the batch
+
+    A chunk the node did not answer is given up after one request; its addresses
+    stay unresolved and are looked up on the explorer instead.
+    """
+    results = rpc_batch(rpc_url, build_calls(addresses))
+
+    if results is None:
+        # Outage or rate limit: splitting would only multiply the failing requests
+        return
+
+    if results == BATCH_REJECTED:
+        if len(addresses) > 1:
+            middle = len(addresses) // 2
+            resolve_chunk(rpc_url, addresses[:middle], resolved)
+            resolve_chunk(rpc_url, addresses[middle:], resolved)
+        return
+
+    fields_per_address = len(SELECTORS)
+    for position, address in enumerate(addresses):
+        base = position * fields_per_address
+        symbol = decode_string_result(results.get(base + 1))
+        if not symbol:
+            continue
+        resolved[address.lower()] = {
+            'name': decode_string_result(results.get(base)),
+            'symbol': symbol,
+            'decimals': decode_uint_result(results.get(base + 2))
+        }
+
+
+def resolve_tokens(addresses: List[str], network: str, rpc_url: str = None,
+                   batch_size: int = RPC_BATCH_SIZE) -> Dict[str, Dict[str, Any]]:
+    """
+    Read name(), symbol() and decimals() for many contracts with batched eth_call
+
+    Returns {lowercase address: {'name', 'symbol', 'decimals'}}; contracts that do
+    not answer symbol() (not a token, reverted, unknown network) are left out.
+    """
+    rpc_url = rpc_url or RPC_URLS.get(network)
+    if not rpc_url:
+        return {}
+
+    unique_addresses = list({str(address).strip().lower(): str(address).strip()
+                             for address in addresses if address}.values())
+    resolved = {}
+    for i in range(0, len(unique_addresses), batch_size):
+        resolve_chunk(rpc_url, unique_addresses[i:i + batch_size], resolved)
+
+    return resolved
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from State_Files import load_json_state, save_json_state
+
+MANIFEST_FILE = 'pipeline_manifest.json'
+
+# Stages to re-run even when nothing changed, e.g. PIPELINE_FORCE=cmc,final_excel or PIPELINE_FORCE=all
+FORCED_STAGES = {name.strip() for name in os.environ.get('PIPELINE_FORCE', '').split(',') if name.strip()}
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> Optional[str]:
+    """SHA-256 of a file's content, or None if it does not exist"""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_key(name: str, input_digests: Dict[str, Optional[str]], config: Dict[str, Any]) -> str:
+    """Hash of a stage's name, input contents and config; the stage re-runs when it changes"""
+    payload = json.dumps({'stage': name, 'inputs': input_digests, 'config': config},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class PipelineManifest:
+    """
+    Record of the last successful run of every stage
+
+    Stored as {stage: {key, inputs, config, outputs, finished_at}}, where inputs
+    and outputs map a label to {path, digest}. Inputs are identified by content,
+    not by name, so a re-created file with the same content counts as unchanged.
+    """
+
+    def __init__(self, path: str = MANIFEST_FILE):
+        self.path = path
+        self._stages = load_json_state(path, 'pipeline manifest', {})
+
+    def outputs(self, name: str) -> Dict[str, str]:
+        """Output paths of a stage's last successful run"""
+        entry = self._stages.get(name, {})
+        return {label: output['path'] for label, output in entry.get('outputs', {}).items()}
+
+    def is_current(self, name: str, key: str) -> bool:
+        """True if the stage last ran with this key and its outputs are still on disk unchanged"""
+        entry = self._stages.get(name)
+        if not entry or entry.get('key') != key:
+            return False
+        # A missing output never counts as unchanged, even if it was already missing when recorded
+        return all(output['digest'] is not None and file_digest(output['path']) == output['digest']
+                   for output in entry['outputs'].values())
+
+    def record(self, name: str, key: str, inputs: Dict[str, Dict[str, Optional[str]]],
+               config: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        self._stages[name] = {
+            'key': key,
+            'inputs': inputs,
+            'config': config,
+            'outputs': {label: {'path': path, 'digest': file_digest(path)} for label, path in outputs.items()},
+            'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+
+    def save(self) -> None:
+        """Write the manifest to disk"""
+        save_json_state(self.path, self._stages, indent=2)
+
+
+def run_stage(manifest: PipelineManifest, name: str, inputs: Dict[str, str], config: Dict[str, Any],
+              run: Callable[[], Optional[Dict[str, str]]], force: bool = False) -> Optional[Dict[str, str]]:
+    """
+    Run a stage unless its inputs and config are unchanged since its last run
+
+    inputs maps a label to a file path, run() does the work and returns its
+    outputs as {label: path} (None or empty on failure). Returns the outputs of
+    this run, or of the recorded run when the stage is skipped.
+    """
+    input_digests = {label: file_digest(path) for label, path in inputs.items()}
+    key = stage_key(name, input_digests, config)
+
+    if not (force or name in FORCED_STAGES or 'all' in FORCED_STAGES) and manifest.is_current(name, key):
+        print(f"Skipping stage '{name}': inputs and config unchanged")
+        return manifest.outputs(name)
+
+    print(f"\nRunning stage '{name}'...")
+    outputs = run()
+    if not outputs:
+        print(f"Stage '{name}' did not produce outputs")
+        return None
+
+    manifest.record(name, key,
+                    {label: {'path': path, 'digest': input_digests[label]} for label, path in inputs.items()},
+                    config, outputs)
+    manifest.save()
+    return outputs
+
+
+def existing_files(paths: Iterable[str]) -> Dict[str, str]:
+    """{path: path} for the paths that exist, as stage inputs/outputs labelled by file name"""
+    return {path: path for path in paths if os.path.exists(path)}
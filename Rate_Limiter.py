@@ -0,0 +1,201 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from Http_Client import http_get
+
+# Requests per minute and burst size for each provider
+DEFAULT_BUDGETS = {
+    'pro-api.coinmarketcap.com': (30, 5),
+    'api.coingecko.com': (30, 5),
+    'etherscan.io': (30, 3),
+    'bscscan.com': (30, 3)
+}
+DEFAULT_HOST_BUDGET = (60, 1)
+
+# Longest single wait for a rate-limited host, whatever the server asks for
+MAX_BLOCK_SECONDS = 300
+
+
+def host_of(url_or_host: str) -> str:
+    """Return the host part of a URL, or the value itself if it is already a host"""
+    if '://' in url_or_host:
+        return urlparse(url_or_host).netloc.lower()
+    return url_or_host.lower()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Convert a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter with a separate budget per host
+
+    Safe to share between threads and asyncio tasks: the lock is only held while
+    reserving a token, the waiting happens outside it.
+    """
+
+    def __init__(self, budgets: Dict[str, Tuple[float, int]] = None,
+                 default_budget: Tuple[float, int] = DEFAULT_HOST_BUDGET):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._requests = Counter()
+        self._default_budget = default_budget
+        for host, (per_minute, burst) in (budgets or {}).items():
+            self.configure(host, per_minute, burst)
+
+    def configure(self, host: str, per_minute: float, burst: int = 1) -> None:
+        """Set the request budget for a host"""
+        with self._lock:
+            self._buckets[host_of(host)] = self._new_bucket(per_minute, burst)
+
+    @staticmethod
+    def _new_bucket(per_minute: float, burst: int) -> Dict[str, float]:
+        capacity = float(max(1, burst))
+        return {
+            'rate': per_minute / 60.0,
+            'capacity': capacity,
+            'tokens': capacity,
+            # Time tokens are refilled from; set into the future while the host is blocked
+            'updated': time.monotonic()
+        }
+
+    def _bucket(self, host: str) -> Dict[str, float]:
+        if host not in self._buckets:
+            self._buckets[host] = self._new_bucket(*self._default_budget)
+        return self._buckets[host]
+
+    def _reserve(self, url_or_host: str) -> float:
+        """Take one token and return how long the caller must wait before using it"""
+        host = host_of(url_or_host)
+        with self._lock:
+            bucket = self._bucket(host)
+            self._requests[host] += 1
+            now = time.monotonic()
+            if now > bucket['updated']:
+                elapsed = now - bucket['updated']
+                bucket['tokens'] = min(bucket['capacity'], bucket['tokens'] + elapsed * bucket['rate'])
+                bucket['updated'] = now
+
+            # Tokens may go negative: each waiter queues behind the previous reservation,
+            # and during a block the queue only starts draining once the block ends
+            bucket['tokens'] -= 1
+            wait = -bucket['tokens'] / bucket['rate'] if bucket['tokens'] < 0 else 0.0
+            return max(0.0, bucket['updated'] - now) + wait
+
+    def request_count(self, url_or_host: str = None) -> int:
+        """Number of requests let through so far, for one host or in total"""
+        with self._lock:
+            if url_or_host is None:
+                return sum(self._requests.values())
+            return self._requests[host_of(url_or_host)]
+
+    def acquire(self, url_or_host: str) -> None:
+        """Block until a request to this host is allowed"""
+        wait = self._reserve(url_or_host)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url_or_host: str) -> None:
+        """Asyncio version of acquire"""
+        wait = self._reserve(url_or_host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def block(self, url_or_host: str, seconds: float) -> None:
+        """
+        Stop all requests to a host for the given number of seconds
+
+        The bucket is emptied and only refills after the block, so callers queued
+        during it are released at the normal rate rather than all at once.
+        """
+        seconds = min(seconds, MAX_BLOCK_SECONDS)
+        with self._lock:
+            bucket = self._bucket(host_of(url_or_host))
+            now = time.monotonic()
+            if now > bucket['updated']:
+                # Keep the tokens earned up to now, as _reserve would
+                bucket['tokens'] = min(bucket['capacity'],
+                                       bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+            bucket['updated'] = max(bucket['updated'], now + seconds)
+            bucket['tokens'] = min(bucket['tokens'], 0.0)
+
+    def update_from_response(self, url: str, response: requests.Response) -> Optional[float]:
+        """
+        Apply Retry-After and rate-limit headers from a response
+
+        Returns the number of seconds the host is blocked for, or None if the
+        response carried no usable hint.
+        """
+        headers = response.headers or {}
+        delay = None
+
+        if response.status_code in (429, 503):
+            delay = parse_retry_after(headers.get('Retry-After'))
+
+        # X-RateLimit-Remaining: 0 with a reset given as epoch time or seconds from now
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if delay is None and remaining is not None and reset is not None:
+            try:
+                if int(float(remaining)) <= 0:
+                    reset_value = float(reset)
+                    delay = max(0.0, reset_value - time.time()) if reset_value > 1e9 else reset_value
+            except ValueError:
+                pass
+
+        if delay is not None:
+            self.block(url, delay)
+        return delay
+
+    @staticmethod
+    def backoff(attempt: int, base: float = 2.0, cap: float = 60.0) -> float:
+        """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+        return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# Limiter shared by all scanners in the process
+shared_limiter = RateLimiter(DEFAULT_BUDGETS)
+
+
+def rate_limited_get(url: str, params: Dict[str, Any] = None, headers: Dict[str, str] = None,
+                     max_retries: int = 3, limiter: RateLimiter = None, **kwargs) -> requests.Response:
+    """
+    GET a URL within its host budget, retrying 429/503 responses after the advertised delay
+
+    Requests go through the pooled per-host sessions in Http_Client, with its timeouts.
+    """
+    limiter = limiter or shared_limiter
+    for attempt in range(max_retries + 1):
+        limiter.acquire(url)
+        response = http_get(url, params=params, headers=headers, **kwargs)
+
+        if response.status_code not in (429, 503) or attempt == max_retries:
+            limiter.update_from_response(url, response)
+            return response
+
+        # Without a server hint, back off with jitter before the next token
+        if limiter.update_from_response(url, response) is None:
+            limiter.block(url, limiter.backoff(attempt))
+        # Hand the connection back to the pool (streamed responses are not read otherwise)
+        response.close()
+
+    return response
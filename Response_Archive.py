@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from Http_Client import storable_headers
+
+ARCHIVE_DIR = 'response_archive'
+
+# 'record' stores every fetched response, 'replay' serves requests only from the
+# archive and never touches the network, 'off' (default) does neither. Recording
+# is opt-in because the archive is never pruned.
+ARCHIVE_MODES = ('record', 'replay', 'off')
+_archive_mode = os.environ.get('CRYPTO_ARCHIVE_MODE', 'off').lower()
+
+
+def set_archive_mode(mode: str) -> None:
+    """Switch between 'record', 'replay' and 'off' for the rest of the process"""
+    global _archive_mode
+    if mode not in ARCHIVE_MODES:
+        raise ValueError(f"Unknown archive mode '{mode}', expected one of {ARCHIVE_MODES}")
+    _archive_mode = mode
+
+
+def get_archive_mode() -> str:
+    return _archive_mode if _archive_mode in ARCHIVE_MODES else 'off'
+
+
+def is_replay() -> bool:
+    return get_archive_mode() == 'replay'
+
+
+class ResponseArchive:
+    """
+    Raw response bodies stored gzip-compressed under their SHA-256, plus an index
+    from request key to (url, status, headers, body digest)
+
+    Identical bodies are stored once. The index keeps the latest response per request.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, 'index.sqlite'), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS requests (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                status INTEGER,
+                headers TEXT,
+                digest TEXT,
+                archived_at REAL
+            )
+        """)
+        self._db.commit()
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], f'{digest}.gz')
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM requests WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key: str, url: str, status: int, headers: Dict[str, str], body: bytes) -> str:
+        """Store a response body (if not already present) and point the request at it, returns the digest"""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(gzip.compress(body))
+            os.replace(temp_path, path)
+
+        stored_headers = storable_headers(headers)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO requests VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, status, json.dumps(stored_headers), digest, time.time())
+            )
+            self._db.commit()
+        return digest
+
+    def get(self, key: str) -> Optional[Tuple[str, int, Dict[str, str], bytes]]:
+        """Return (url, status, headers, body) for an archived request, or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, headers, digest FROM requests WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        url, status, headers, digest = row
+        try:
+            with open(self.object_path(digest), 'rb') as f:
+                body = gzip.decompress(f.read())
+        except (OSError, EOFError):
+            return None
+        return url, status, json.loads(headers), body
+
+
+_shared_archive = None
+_shared_archive_lock = threading.Lock()
+
+
+def get_shared_archive() -> ResponseArchive:
+    """Return the process-wide archive, opening it on first use"""
+    global _shared_archive
+    with _shared_archive_lock:
+        if _shared_archive is None:
+            _shared_archive = ResponseArchive()
+        return _shared_archive
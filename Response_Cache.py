@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional, Callable
+from urllib.parse import urlparse, urlencode
+
+from Http_Client import storable_headers
+from Rate_Limiter import rate_limited_get
+from Response_Archive import get_archive_mode, get_shared_archive
+
+CACHE_FILE = 'http_cache.sqlite'
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Status returned in archive replay mode for requests that were never recorded
+NOT_ARCHIVED_STATUS = 504
+
+# Time-to-live in seconds by kind of data
+METADATA_TTL = 7 * 24 * 60 * 60   # names, symbols, platforms, explorer token pages
+LISTING_TTL = 24 * 60 * 60        # asset listings and mixed metadata/price payloads
+QUOTES_TTL = 10 * 60              # prices, market caps and volumes
+
+# First matching URL fragment decides the TTL
+ENDPOINT_TTLS = [
+    ('/v1/cryptocurrency/quotes/', QUOTES_TTL),
+    ('/v1/cryptocurrency/info', METADATA_TTL),
+    ('/v1/cryptocurrency/map', LISTING_TTL),
+    ('api.coingecko.com/api/v3/search', METADATA_TTL),
+    ('api.coingecko.com/api/v3/coins/markets', QUOTES_TTL),
+    ('api.coingecko.com/api/v3/coins/', LISTING_TTL),
+    ('etherscan.io/token/', METADATA_TTL),
+    ('bscscan.com/token/', METADATA_TTL)
+]
+DEFAULT_TTL = LISTING_TTL
+
+# 'use' reads and writes the cache, 'refresh' ignores stored entries but stores
+# new responses, 'bypass' neither reads nor writes
+CACHE_MODES = ('use', 'refresh', 'bypass')
+_cache_mode = os.environ.get('CRYPTO_CACHE_MODE', 'use').lower()
+
+
+def set_cache_mode(mode: str) -> None:
+    """Switch between 'use', 'refresh' and 'bypass' for the rest of the process"""
+    global _cache_mode
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+    _cache_mode = mode
+
+
+def get_cache_mode() -> str:
+    return _cache_mode if _cache_mode in CACHE_MODES else 'use'
+
+
+def ttl_for(url: str) -> int:
+    """Return the TTL for a URL based on ENDPOINT_TTLS"""
+    for fragment, ttl in ENDPOINT_TTLS:
+        if fragment in url:
+            return ttl
+    return DEFAULT_TTL
+
+
+def request_key(url: str, params: Dict[str, Any] = None, method: str = 'GET') -> str:
+    """Hash a normalized request (method, lowercase scheme/host, path, sorted params)"""
+    parsed = urlparse(url)
+    query_params = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    normalized = '|'.join([
+        method.upper(),
+        parsed.scheme.lower(),
+        parsed.netloc.lower(),
+        parsed.path.rstrip('/') or '/',
+        parsed.query,
+        urlencode(query_params)
+    ])
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class CachedResponse:
+    """Minimal stand-in for requests.Response rebuilt from a stored body"""
+
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], content: bytes):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.from_cache = True
+        # Set for a body whose download was stopped early; such bodies are not cached
+        self.truncated = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class ResponseCache:
+    """SQLite-backed response store with per-request TTL and size-bounded LRU eviction"""
+
+    def __init__(self, path: str = CACHE_FILE, max_bytes: int = MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                stored_at REAL,
+                accessed_at REAL,
+                size INTEGER
+            )
+        """)
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str, ttl: float) -> Optional[CachedResponse]:
+        """Return the stored response if it is younger than ttl seconds"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, headers, body, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[4] > ttl:
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        url, status, headers, body, _ = row
+        return CachedResponse(url, status, json.loads(headers), bytes(body))
+
+    def put(self, key: str, url: str, status: int, headers: Dict[str, str], body: bytes) -> None:
+        """Store a response, evicting least recently used entries beyond max_bytes"""
+        now = time.time()
+        stored_headers = storable_headers(headers)
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old:
+                self._total_bytes -= old[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, status, json.dumps(stored_headers), sqlite3.Binary(body), now, now, len(body))
+            )
+            self._total_bytes += len(body)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._total_bytes = 0
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> ResponseCache:
+    """Return the process-wide cache, opening it on first use"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
+
+
+def cached_get(url: str, params: Dict[str, Any] = None, headers: Dict[str, str] = None,
+               ttl: float = None, fetch: Callable = None, cache: ResponseCache = None):
+    """
+    GET through the on-disk cache
+
+    Only successful, complete responses are stored. Headers (e.g. API keys) are not part of
+    the key. On a miss the request goes through `fetch`, which defaults to the
+    shared rate-limited GET. Every fetched response is also kept in the response
+    archive, and in archive replay mode only the archive is consulted.
+    """
+    mode = get_cache_mode()
+    archive_mode = get_archive_mode()
+    key = request_key(url, params)
+
+    # Replay answers from the archive only, so parser changes run on the raw bodies without network
+    if archive_mode == 'replay':
+        archived = get_shared_archive().get(key)
+        if archived is None:
+            return CachedResponse(url, NOT_ARCHIVED_STATUS, {}, b'')
+        return CachedResponse(*archived)
+
+    cache = cache or (get_shared_cache() if mode != 'bypass' else None)
+
+    if mode == 'use':
+        hit = cache.get(key, ttl if ttl is not None else ttl_for(url))
+        if hit is not None:
+            # Responses cached before the archive existed are archived on first reuse
+            if archive_mode == 'record' and not get_shared_archive().has(key):
+                get_shared_archive().put(key, url, hit.status_code, hit.headers, hit.content)
+            return hit
+
+    response = (fetch or rate_limited_get)(url, params=params, headers=headers)
+
+    if archive_mode == 'record' and response is not None:
+        get_shared_archive().put(key, url, response.status_code, response.headers, response.content)
+
+    if (mode != 'bypass' and response is not None and response.status_code == 200
+            and not getattr(response, 'truncated', False)):
+        cache.put(key, url, response.status_code, response.headers, response.content)
+
+    return response
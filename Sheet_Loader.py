@@ -0,0 +1,49 @@
+import os
+import threading
+from typing import Dict, Union
+
+import pandas as pd
+
+DEFAULT_SHEET = "Assets missing info"
+
+# Parsed workbooks by (absolute path, modification time, size), so every scanner
+# in the process shares one parse of the same file
+_workbooks = {}
+_workbooks_lock = threading.Lock()
+
+
+def load_workbook(path: str) -> Dict[str, pd.DataFrame]:
+    """Return all sheets of a workbook, parsing it only if the file changed since the last call"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _workbooks_lock:
+        if key not in _workbooks:
+            # Drop frames of older versions of the same file
+            for old_key in [k for k in _workbooks if k[0] == key[0]]:
+                del _workbooks[old_key]
+            _workbooks[key] = pd.read_excel(path, sheet_name=None)
+        return _workbooks[key]
+
+
+def load_sheet(path: str, sheet_name: Union[str, int] = DEFAULT_SHEET) -> pd.DataFrame:
+    """
+    Return one sheet (by name or position) of a workbook from the shared cache
+
+    The frame is shared between callers: treat it as read-only and copy() it before changing it.
+    """
+    sheets = load_workbook(path)
+    if isinstance(sheet_name, int):
+        return list(sheets.values())[sheet_name]
+    return sheets[sheet_name]
+
+
+def column_or_missing(df: pd.DataFrame, column: str) -> pd.Series:
+    """The named column, or an all-missing column when the sheet has none by that name"""
+    if column in df.columns:
+        return df[column]
+    return pd.Series(None, index=df.index, dtype=object)
+
+
+def excel_row_numbers(df: pd.DataFrame) -> pd.Series:
+    """Excel row number of every frame row (1-based, after the header row)"""
+    return pd.Series(df.index + 2, index=df.index)
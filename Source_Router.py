@@ -0,0 +1,170 @@
+import threading
+import time
+from typing import Dict, List, Any, Callable, Tuple
+
+from Rate_Limiter import shared_limiter
+from State_Files import load_json_state, save_json_state
+from Typed_Store import is_missing
+
+SOURCE_STATS_FILE = 'source_router_stats.json'
+
+# Kinds of rows, by the most specific identifier they carry
+ROW_TYPES = ('address', 'symbol', 'name')
+
+# Relative price of one network request per source, on top of its latency
+SOURCE_COSTS = {
+    'onchain': 0.1,      # one JSON-RPC batch covers many contracts
+    'explorer': 1.0,     # scraped page, tight politeness budget
+    'coingecko': 1.0     # public API, tight rate limit
+}
+DEFAULT_SOURCE_COST = 1.0
+
+# Older observations fade so the router follows changes in a source's behaviour
+STATS_DECAY = 0.98
+
+# Assumed history for a source/row type pair that has not been tried yet
+PRIOR_ATTEMPTS = 2.0
+PRIOR_HIT_RATE = 0.5
+PRIOR_SECONDS = 1.0
+PRIOR_CALLS = 1.0
+
+
+def is_present(value) -> bool:
+    return not is_missing(value)
+
+
+def row_type(record: Dict[str, Any]) -> str:
+    """Classify a row as 'address', 'symbol' or 'name' by what it already has"""
+    if is_present(record.get('Address')):
+        return 'address'
+    if is_present(record.get('Symbol')):
+        return 'symbol'
+    return 'name'
+
+
+def is_resolved(result: Dict[str, Any], kind: str) -> bool:
+    """A result resolves a row when it supplies what that kind of row is missing"""
+    if not result:
+        return False
+    if kind == 'symbol':
+        return is_present(result.get('Address'))
+    return is_present(result.get('Symbol'))
+
+
+class SourceRouter:
+    """
+    Per-source, per-row-type statistics and the dispatch order derived from them
+
+    Stats are stored as {source: {row_type: {attempts, hits, seconds, calls}}},
+    all decayed by STATS_DECAY on every new observation.
+    """
+
+    def __init__(self, path: str = SOURCE_STATS_FILE, costs: Dict[str, float] = None):
+        self.path = path
+        self.costs = dict(SOURCE_COSTS, **(costs or {}))
+        self._lock = threading.Lock()
+        self._stats = load_json_state(path, 'router stats', {})
+
+    def _entry(self, source: str, kind: str) -> Dict[str, float]:
+        return self._stats.setdefault(source, {}).setdefault(
+            kind, {'attempts': 0.0, 'hits': 0.0, 'seconds': 0.0, 'calls': 0.0})
+
+    def record(self, source: str, kind: str, hit: bool, seconds: float, calls: float = 1.0) -> None:
+        """Add one row's outcome for a source"""
+        with self._lock:
+            entry = self._entry(source, kind)
+            for field in entry:
+                entry[field] *= STATS_DECAY
+            entry['attempts'] += 1
+            entry['hits'] += 1 if hit else 0
+            entry['seconds'] += seconds
+            entry['calls'] += calls
+
+    def expected_cost(self, source: str, kind: str) -> float:
+        """Expected latency plus request cost per resolved row, lower is better"""
+        with self._lock:
+            entry = self._entry(source, kind)
+            attempts = entry['attempts'] + PRIOR_ATTEMPTS
+            hit_rate = (entry['hits'] + PRIOR_HIT_RATE * PRIOR_ATTEMPTS) / attempts
+            seconds = (entry['seconds'] + PRIOR_SECONDS * PRIOR_ATTEMPTS) / attempts
+            calls = (entry['calls'] + PRIOR_CALLS * PRIOR_ATTEMPTS) / attempts
+        cost = self.costs.get(source, DEFAULT_SOURCE_COST)
+        return (seconds + cost * calls) / max(hit_rate, 0.01)
+
+    def rank(self, kind: str, sources: List[str]) -> List[str]:
+        """Order sources for a row type, cheapest expected resolution first"""
+        return sorted(sources, key=lambda source: self.expected_cost(source, kind))
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Hit rate, seconds and calls per row for every source and row type seen"""
+        with self._lock:
+            return {
+                source: {
+                    kind: {
+                        'hit_rate': entry['hits'] / entry['attempts'] if entry['attempts'] else 0.0,
+                        'seconds': entry['seconds'] / entry['attempts'] if entry['attempts'] else 0.0,
+                        'calls': entry['calls'] / entry['attempts'] if entry['attempts'] else 0.0
+                    }
+                    for kind, entry in kinds.items()
+                }
+                for source, kinds in self._stats.items()
+            }
+
+    def save(self) -> None:
+        """Write the stats to disk"""
+        with self._lock:
+            save_json_state(self.path, self._stats, indent=2)
+
+    def route(self, rows: List[Dict[str, Any]],
+              resolvers: Dict[str, Tuple[Callable, Callable]]) -> List[Dict[str, Any]]:
+        """
+        Resolve rows by trying sources in order of expected cost, escalating on a miss
+
+        resolvers maps a source name to (accepts, resolve_batch): accepts(row) says
+        whether the source can look the row up at all, resolve_batch(rows) returns
+        one result record (or None) per row. Work runs in rounds so each source gets
+        its rows as one batch and later rounds rank with the updated stats. Rows no
+        source resolves keep the last miss record. Results follow the input order.
+        """
+        results = [None] * len(rows)
+        tried = [set() for _ in rows]
+        pending = list(range(len(rows)))
+        calls_before = shared_limiter.request_count()
+
+        while pending:
+            # Next source for every pending row
+            batches = {}
+            for idx in pending:
+                kind = row_type(rows[idx])
+                candidates = [source for source, (accepts, _) in resolvers.items()
+                              if source not in tried[idx] and accepts(rows[idx])]
+                if candidates:
+                    batches.setdefault(self.rank(kind, candidates)[0], []).append(idx)
+
+            if not batches:
+                break
+
+            pending = []
+            for source, indices in batches.items():
+                print(f"Routing {len(indices)} rows to {source}...")
+                calls_start = shared_limiter.request_count()
+                start = time.perf_counter()
+                batch_results = resolvers[source][1]([rows[idx] for idx in indices])
+                seconds = (time.perf_counter() - start) / len(indices)
+                calls = (shared_limiter.request_count() - calls_start) / len(indices)
+
+                for idx, result in zip(indices, batch_results):
+                    kind = row_type(rows[idx])
+                    hit = is_resolved(result, kind)
+                    self.record(source, kind, hit, seconds, calls)
+                    tried[idx].add(source)
+                    if result is not None:
+                        results[idx] = result
+                    if not hit:
+                        pending.append(idx)
+
+        self.save()
+        resolved = sum(1 for row, result in zip(rows, results) if is_resolved(result, row_type(row)))
+        print(f"Router resolved {resolved} of {len(rows)} rows with "
+              f"{shared_limiter.request_count() - calls_before} network requests")
+        return [result for result in results if result is not None]
@@ -0,0 +1,27 @@
+import json
+import os
+from typing import Any
+
+
+def load_json_state(path: str, description: str, default: Any = None) -> Any:
+    """
+    Read a JSON state file, or return default if it is missing or unreadable
+
+    An unreadable file is reported and ignored, so a damaged file only costs the state it held.
+    """
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable {description} {path}: {str(e)}")
+        return default
+
+
+def save_json_state(path: str, data: Any, **dump_options) -> None:
+    """Write a JSON state file atomically, via a temporary file next to it"""
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **dump_options)
+    os.replace(temp_path, path)
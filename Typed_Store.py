@@ -0,0 +1,251 @@
+import gzip
+import io
+import json
+import math
+from typing import Any, Dict, Iterable, Iterator, List
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+STORE_FORMAT = 'typed-jsonl'
+STORE_VERSION = 1
+
+# Parquet when pyarrow is installed, otherwise gzip-compressed typed JSON Lines
+STORE_EXTENSION = '.parquet' if pq is not None else '.jsonl.gz'
+
+# Columns of the record files and their types, in file order; fields not listed are not stored
+RECORD_SCHEMA = {
+    'Row': 'int',
+    'Blockchain': 'string',
+    'Name': 'string',
+    'Symbol': 'string',
+    'Address': 'string',
+    'Price': 'float',
+    'MarketCap': 'float',
+    'CirculatingSupply': 'float',
+    'MaxSupply': 'float',
+    'Volume24h': 'float',
+    'PercentChange24h': 'float',
+    'PercentChange7d': 'float',
+    'PercentChange30d': 'float',
+    'Network': 'string',
+    'Slug': 'string',
+    'DateAdded': 'string',
+    'Tags': 'string',
+    'LookupMethod': 'string',
+    'Decimals': 'int',
+    'Reason': 'string'
+}
+
+# Sentinel strings the scanners use for missing values, stored as nulls
+MISSING_VALUES = {"Not found", "Not available", "Error", "", "nan", "None", "N/A"}
+
+# Rows per Parquet row group, the only rows held in memory while writing
+PARQUET_BATCH_SIZE = 10000
+
+PANDAS_TYPES = {'int': 'Int64', 'float': 'float64', 'string': 'object'}
+
+
+def iter_json_records(json_file, chunk_size=1 << 16):
+    """
+    Yield the records of a JSON array file (or a JSON Lines file) one at a time
+
+    The file is decoded incrementally, so only the current chunk is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(json_file, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        pos = len(buffer) - len(buffer.lstrip())
+
+        if not buffer[pos:pos + 1] == '[':
+            # JSON Lines
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        pos += 1
+        while True:
+            # Skip separators, reading more of the file when the buffer runs out
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                buffer = f.read(chunk_size)
+                pos = 0
+                if not buffer:
+                    return
+                continue
+            if buffer[pos] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+
+            yield record
+            pos = end
+            if pos > chunk_size:
+                buffer = buffer[pos:]
+                pos = 0
+
+
+def store_path(prefix: str, timestamp: str) -> str:
+    """File name for a record file, e.g. crypto_data_final_<timestamp>.parquet"""
+    return f"{prefix}_{timestamp}{STORE_EXTENSION}"
+
+
+def is_missing(value: Any) -> bool:
+    """True for None, NaN and sentinels such as 'Not found'"""
+    return value is None or str(value).strip() in MISSING_VALUES
+
+
+def missing_mask(frame: pd.DataFrame) -> pd.DataFrame:
+    """is_missing for a whole frame at once: True where a value is null or a sentinel"""
+    return frame.isna() | frame.apply(lambda column: column.astype(str).str.strip().isin(MISSING_VALUES))
+
+
+def convert_value(value: Any, kind: str) -> Any:
+    """Value as the column type, None for sentinels and values that do not parse"""
+    if is_missing(value):
+        return None
+    if kind == 'string':
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, ensure_ascii=False)
+        return str(value)
+
+    if isinstance(value, str):
+        value = value.strip().lstrip('$').rstrip('%').replace(',', '')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(number):
+        return None
+    if kind == 'int':
+        return int(number) if number.is_integer() else None
+    return number
+
+
+def to_typed_row(record: Dict[str, Any], schema: Dict[str, str]) -> List[Any]:
+    """A record's values in schema order, converted to the column types"""
+    return [convert_value(record.get(field), kind) for field, kind in schema.items()]
+
+
+def write_records(path: str, records: Iterable[Dict[str, Any]], schema: Dict[str, str] = None) -> int:
+    """
+    Stream records into a typed record file, returns the number of rows written
+
+    Parquet for .parquet paths, otherwise gzip JSON Lines with a schema header and
+    one value array per row. Prices, supplies and percentages become floats and
+    sentinel strings become nulls. Only the schema's columns are stored, and
+    records are converted as they arrive, so any iterable can be written in bounded memory.
+    """
+    schema = schema or RECORD_SCHEMA
+    count = 0
+
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow is required to write Parquet files")
+        arrow_types = {'int': pa.int64(), 'float': pa.float64(), 'string': pa.string()}
+        arrow_schema = pa.schema([(field, arrow_types[kind]) for field, kind in schema.items()])
+        with pq.ParquetWriter(path, arrow_schema, compression='zstd') as writer:
+            batch = []
+            for record in records:
+                batch.append(dict(zip(schema, to_typed_row(record, schema))))
+                count += 1
+                if len(batch) == PARQUET_BATCH_SIZE:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=arrow_schema))
+                    batch = []
+            if batch or not count:
+                writer.write_table(pa.Table.from_pylist(batch, schema=arrow_schema))
+        return count
+
+    # No file name or timestamp in the gzip header, so the same records always give the same bytes
+    with open(path, 'wb') as raw:
+        with io.TextIOWrapper(gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0), encoding='utf-8') as f:
+            header = {'format': STORE_FORMAT, 'version': STORE_VERSION, 'schema': schema}
+            f.write(json.dumps(header) + '\n')
+            for record in records:
+                f.write(json.dumps(to_typed_row(record, schema), ensure_ascii=False, separators=(',', ':')) + '\n')
+                count += 1
+    return count
+
+
+def read_schema(path: str) -> Dict[str, str]:
+    """Schema of a typed record file"""
+    if path.endswith('.parquet'):
+        kinds = {'int64': 'int', 'double': 'float'}
+        return {field.name: kinds.get(str(field.type), 'string') for field in pq.read_schema(path)}
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+    if header.get('format') != STORE_FORMAT:
+        raise ValueError(f"{path} is not a typed record file")
+    return header['schema']
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the records of a typed record file, or of a legacy JSON/JSON Lines file
+
+    Typed files yield every schema column, with None for missing values.
+    """
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError("pyarrow is required to read Parquet files")
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('format') != STORE_FORMAT:
+                raise ValueError(f"{path} is not a typed record file")
+            fields = list(header['schema'])
+            for line in f:
+                if line.strip():
+                    yield dict(zip(fields, json.loads(line)))
+        return
+
+    yield from iter_json_records(path)
+
+
+def read_records(path: str) -> List[Dict[str, Any]]:
+    return list(iter_records(path))
+
+
+def read_frame(path: str) -> pd.DataFrame:
+    """
+    Load a record file into a DataFrame with typed columns
+
+    Parquet is read as is; typed JSON Lines only need their dtypes applied, and
+    legacy JSON files are converted to the same types on the way in.
+    """
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+
+    if path.endswith('.gz'):
+        schema = read_schema(path)
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            f.readline()
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        schema = RECORD_SCHEMA
+        rows = [to_typed_row(record, schema) for record in iter_json_records(path)]
+
+    frame = pd.DataFrame(rows, columns=list(schema))
+    return frame.astype({field: PANDAS_TYPES[kind] for field, kind in schema.items()})